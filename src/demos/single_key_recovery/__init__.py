@@ -12,6 +12,8 @@ class SingleKeyRecoveryDemo(QWidget):
         self.initUI()
         self.shares = []
         self.compontents = []
+        # tags already derived are reused when the same shares are validated again
+        self.kdf_cache = kr.utils.KDFCache()
 
     def initUI(self):
         
@@ -382,10 +384,10 @@ class SingleKeyRecoveryDemo(QWidget):
         return box_layout, btn, label, share_input, tag_input
 
     def validate_shares(self):
-        validator = kr.single_key.SingleKeyValidator(kr.utils.from_hex_no_prefix(self.commit_input.text()))
+        validator = kr.single_key.SingleKeyValidator(kr.utils.from_hex_no_prefix(self.commit_input.text()), self.kdf_cache)
+        verdicts = validator.validate_shares(self.shares, "password")
         for i in range(len(self.shares)):
-            share = self.shares[i]
-            if not validator.validate_share(share, "password"):
+            if not verdicts[i]:
                 self.compontents[i][0].setText("invalid")
                 self.compontents[i][0].setStyleSheet("color: red")
             else:
@@ -13,7 +13,7 @@ class Generator:
 
     def generate_shares(self, password: str, n: int, start: int = 1, 
                         kdf_time_cost = 3, kdf_memory_cost = 2**16,
-                        kdf_parallelism = 1) -> list[Share]:
+                        kdf_parallelism = 1, scheduler = None) -> list[Share]:
         raise NotImplementedError
 
     # read only properties
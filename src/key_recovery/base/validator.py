@@ -10,6 +10,11 @@ class Validator:
     def validate_share(self, share: Share, password: str) -> bool:
         raise NotImplementedError
     
+    # Validates a batch of shares
+    # Returns a list with True, False or None (not checked) for every share
+    def validate_shares(self, shares: list[Share], password: str, threshold: int = None, scheduler = None) -> list:
+        raise NotImplementedError
+
     # Validates generated secret
     # Returns True if secret is valid
     #         False otherwise
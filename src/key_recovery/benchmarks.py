@@ -0,0 +1,33 @@
+import random
+import time
+from .single_key import SingleKeyGenerator
+from .utils import evaluate_polynomial
+
+
+# Compares the share evaluation loop of generate_share, one x at a time,
+# with evaluate_polynomial for all x at once
+def benchmark_share_evaluation(configurations=((2**31 - 1, 100, 10000), (2**127 - 1, 100, 10000),
+                                                (2**127 - 1, 300, 10000), (2**127 - 1, 4096, 8192))):
+    results = []
+    print("=== Share evaluation benchmark ===")
+    for prime, t, n in configurations:
+        polynomial = [random.randint(1, prime - 1) for _ in range(t)]
+        xs = list(range(1, n + 1))
+
+        start = time.perf_counter()
+        expected = [SingleKeyGenerator.generate_share(polynomial, x, prime) for x in xs]
+        loop = time.perf_counter() - start
+
+        start = time.perf_counter()
+        shares = evaluate_polynomial(polynomial, xs, prime)
+        batch = time.perf_counter() - start
+        assert shares == expected
+
+        print(f"p=2^{prime.bit_length()}-1, t={t}, n={n}: loop {loop:.3f} s, batch {batch:.3f} s, "
+              f"speedup {loop / batch:.1f}x")
+        results.append({"prime_bits": prime.bit_length(), "t": t, "n": n, "loop": loop, "batch": batch})
+    return results
+
+
+if __name__ == "__main__":
+    benchmark_share_evaluation()
@@ -1,9 +1,13 @@
 from ..base.generator import Generator
-from ..utils import pqhash, to_bytes, to_hex_no_prefix
+from ..utils import pqhash, to_bytes, to_hex_no_prefix, evaluate_polynomial, KDFScheduler, KDFCache
 from .share import SingleKeyShare
 import random
 from argon2.low_level import hash_secret_raw, Type
 
+# default Argon2 parameters of the share tags, the memory cost is in KiB (64 MiB)
+KDF_TIME_COST = 3
+KDF_MEMORY_COST = 2**16
+KDF_PARALLELISM = 1
 
 class SingleKeyGenerator(Generator):
     def __init__(self, threashold: int, prime: int = None):
@@ -15,8 +19,8 @@ class SingleKeyGenerator(Generator):
         return self._commitment
     
     def generate_shares(self, password: str, n: int, start: int = 1, 
-                        kdf_time_cost = 3, kdf_memory_cost = 2**16,
-                        kdf_parallelism = 1) -> list[SingleKeyShare]:
+                        kdf_time_cost = KDF_TIME_COST, kdf_memory_cost = KDF_MEMORY_COST,
+                        kdf_parallelism = KDF_PARALLELISM, scheduler: KDFScheduler = None) -> list[SingleKeyShare]:
         # we have the threashold t
         # so polynomial will be of degree t-1
         # coeficients c1, c2, ..., ct-1 will be random
@@ -30,14 +34,20 @@ class SingleKeyGenerator(Generator):
                 polynomial[i] = random.randint(1, 2**32 - 1)
         polynomial[0] = self._secret
 
+        # generate share for every i, evaluated for all i at once
+        xs = list(range(start, start + n))
+        points = list(zip(xs, evaluate_polynomial(polynomial, xs, self._prime)))
+
+        # generate the verification tags
+        # with a scheduler the Argon2 calls run concurrently within its memory budget
+        tag_arguments = [(password, point, self._commitment, kdf_time_cost, kdf_memory_cost, kdf_parallelism) for point in points]
+        if scheduler is None:
+            tags = [SingleKeyGenerator.generate_tag(*arguments) for arguments in tag_arguments]
+        else:
+            tags = scheduler.map(SingleKeyGenerator.generate_tag, kdf_memory_cost, tag_arguments)
+
         shares = []
-        for i in range(start, start + n):
-            # generate share for i
-            share = SingleKeyGenerator.generate_share(polynomial, i, self._prime)
-            
-            # generate the verification tag
-            tag = SingleKeyGenerator.generate_tag(password, (i, share), self._commitment, kdf_time_cost, kdf_memory_cost, kdf_parallelism)
-            
+        for (i, share), tag in zip(points, tags):
             # share object will hold hex representation of share, tag and commitment 
             # without "0x" prefix
             share_object = SingleKeyShare(
@@ -71,7 +81,15 @@ class SingleKeyGenerator(Generator):
 
 
     @staticmethod
-    def generate_tag(password: str, share: tuple[int, int], commitment: int, kdf_time_cost = 3, kdf_memory_cost = 2**16, kdf_parallelism = 1):
+    def generate_tag(password: str, share: tuple[int, int], commitment: int, kdf_time_cost = KDF_TIME_COST,
+                     kdf_memory_cost = KDF_MEMORY_COST, kdf_parallelism = KDF_PARALLELISM,
+                     cache: KDFCache = None):
+        # with a cache, a tag derived before for the same inputs is not derived again
+        if cache is not None:
+            key = cache.key(password, share, commitment, (kdf_time_cost, kdf_memory_cost, kdf_parallelism))
+            return cache.get(key, lambda: SingleKeyGenerator.generate_tag(
+                password, share, commitment, kdf_time_cost, kdf_memory_cost, kdf_parallelism))
+
         # P + C(S) in the docs
         password_bytes = password.encode() + to_bytes(share[0]) + to_bytes(share[1])
 
@@ -1,6 +1,7 @@
 from ..base.recoverer import Recoverer
 from .share import SingleKeyShare
-from ..utils import from_hex_no_prefix
+from ..utils import from_hex_no_prefix, interpolate_at_zero, reed_solomon
+from .validator import SingleKeyValidator
 
 
 class SingleKeyRecoverer(Recoverer):
@@ -19,9 +20,48 @@ class SingleKeyRecoverer(Recoverer):
             points.append((x, y))
         if len(points) < self.threashold:
             raise ValueError("Not enough shares to recover the key")
-        
+
+        if self.prime is not None:
+            # exactly t points determine the polynomial,
+            # barycentric weights with one modular inversion, cached per x set
+            return interpolate_at_zero(points[:self.threashold], self.prime)
         return self._lagrange_interpolation(points)
     
+    # Recovers the key when some of the shares may have been tampered with
+    # the shares are decoded as a Reed-Solomon codeword (Gao's algorithm), which corrects
+    # up to (n - t) / 2 wrong shares without deriving any tag, and the result is checked
+    # once against the commitment with validator.validate_secret
+    # only if decoding fails or the check fails, the share tags are validated with the password
+    # and the key is recovered from the valid shares
+    # Returns (key, invalid shares)
+    def recover_robust(self, shares: list[SingleKeyShare], validator: SingleKeyValidator = None,
+                       password: str = None) -> tuple[int, list[SingleKeyShare]]:
+        if self.prime is None:
+            raise ValueError("Robust recovery requires a prime")
+        by_x = {}
+        for share in shares:
+            by_x.setdefault(from_hex_no_prefix(share.share[0]) % self.prime, share)
+        points = [(x, from_hex_no_prefix(share.share[1])) for x, share in by_x.items()]
+
+        try:
+            polynomial, wrong = reed_solomon.decode(points, self.threashold, self.prime)
+            key = polynomial[0]
+            if validator is None or validator.validate_secret(key):
+                return key, [by_x[x] for x in wrong]
+        except ValueError:
+            if validator is None or password is None:
+                raise
+
+        if validator is None or password is None:
+            raise ValueError("Recovered key does not match the commitment")
+        unique_shares = list(by_x.values())
+        verdicts = validator.validate_shares(unique_shares, password)
+        valid = [share for share, verdict in zip(unique_shares, verdicts) if verdict]
+        key = self.recover(valid)
+        if not validator.validate_secret(key):
+            raise ValueError("Recovered key does not match the commitment")
+        return key, [share for share, verdict in zip(unique_shares, verdicts) if not verdict]
+
     def _lagrange_interpolation(self, points: list[tuple[int, int]]) -> int:
         result = 0
         for i in range(len(points)):
@@ -38,4 +78,48 @@ class SingleKeyRecoverer(Recoverer):
             result += term
             if self.prime is not None:
                 result %= self.prime
-        return int(result)
\ No newline at end of file
+        return int(result)
+
+
+# Checks recover_robust on shares with tampered y values:
+# up to (n - t) // 2 of them are corrected by decoding and reported,
+# one more is rejected without a password and recovered with the validate_shares fallback
+# Run from src with: python -c "from key_recovery.single_key.recoverer import test_recover_robust; test_recover_robust()"
+def test_recover_robust(threshold: int = 3, n: int = 7, prime: int = 2**127 - 1):
+    from dataclasses import replace
+    from .generator import SingleKeyGenerator
+    from ..utils import to_hex_no_prefix
+
+    print("=== Robust recovery ===")
+    secret, password = 123456789, "password"
+    generator = SingleKeyGenerator(threshold, prime)
+    generator.commit(secret)
+    shares = generator.generate_shares(password, n)
+    recoverer = SingleKeyRecoverer(threshold, prime)
+    validator = SingleKeyValidator(generator.commitment)
+
+    def tamper(count):
+        tampered = list(shares)
+        for i in range(count):
+            y = from_hex_no_prefix(shares[i].share[1])
+            tampered[i] = replace(shares[i], share=(shares[i].share[0], to_hex_no_prefix((y + 1) % prime)))
+        return tampered
+
+    capacity = (n - threshold) // 2
+    tampered = tamper(capacity)
+    key, invalid = recoverer.recover_robust(tampered, validator)
+    print(f"{capacity} tampered shares corrected and reported:",
+          "PASS" if key == secret and invalid == tampered[:capacity] else "FAIL")
+
+    tampered = tamper(capacity + 1)
+    try:
+        recoverer.recover_robust(tampered, validator)
+        rejected = False
+    except ValueError:
+        rejected = True
+    print(f"{capacity + 1} tampered shares rejected without a password:", "PASS" if rejected else "FAIL")
+
+    key, invalid = recoverer.recover_robust(tampered, validator, password)
+    print(f"{capacity + 1} tampered shares recovered with share validation:",
+          "PASS" if key == secret and invalid == tampered[:capacity + 1] else "FAIL")
+    print()
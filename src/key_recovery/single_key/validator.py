@@ -1,20 +1,72 @@
 from .share import SingleKeyShare
 from ..base.validator import Validator
-from .generator import SingleKeyGenerator
-from ..utils import to_hex_no_prefix, from_hex_no_prefix
+from .generator import SingleKeyGenerator, KDF_TIME_COST, KDF_MEMORY_COST, KDF_PARALLELISM
+from ..utils import to_hex_no_prefix, from_hex_no_prefix, KDFScheduler, KDFCache, default_scheduler
+from concurrent.futures import FIRST_COMPLETED, wait
 
 class SingleKeyValidator(Validator):
-    def __init__(self, commitment: str):
+    # kdf_cache is an optional KDFCache, validating the same share
+    # with the same password again then skips the Argon2 derivation
+    def __init__(self, commitment: str, kdf_cache: KDFCache = None):
         super().__init__(commitment)
+        self._kdf_cache = kdf_cache
 
     # Validates the share
     # Returns True if share is valid
     #         False otherwise
     def validate_share(self, share: SingleKeyShare, password: str) -> bool:
         point = (from_hex_no_prefix(share.share[0]), from_hex_no_prefix(share.share[1]))
-        generated_tag = SingleKeyGenerator.generate_tag(password, point, self._commitment)
+        generated_tag = SingleKeyGenerator.generate_tag(password, point, self._commitment, cache=self._kdf_cache)
         return share.tag == to_hex_no_prefix(generated_tag) and share.commitment == to_hex_no_prefix(self._commitment)
     
+    # Returns True if the tag of the share is in the KDF cache, so validating it derives nothing
+    def _tag_cached(self, share: SingleKeyShare, password: str) -> bool:
+        if self._kdf_cache is None:
+            return False
+        point = (from_hex_no_prefix(share.share[0]), from_hex_no_prefix(share.share[1]))
+        key = self._kdf_cache.key(password, point, self._commitment, (KDF_TIME_COST, KDF_MEMORY_COST, KDF_PARALLELISM))
+        return key in self._kdf_cache
+
+    # Validates a batch of shares concurrently
+    # the Argon2 calls run on the scheduler, the process wide one by default,
+    # so every batch shares one memory budget
+    # shares whose tags are cached are validated first, without reserving scheduler memory
+    # with a threshold, validation stops once that many shares are valid
+    # Returns a list in the order of the shares with True if the share is valid,
+    #         False if it is invalid and None if it was not checked
+    def validate_shares(self, shares: list[SingleKeyShare], password: str, threshold: int = None,
+                        scheduler: KDFScheduler = None) -> list:
+        verdicts = [None] * len(shares)
+        valid = 0
+        uncached = []
+        for index, share in enumerate(shares):
+            if threshold is not None and valid >= threshold:
+                return verdicts
+            if self._tag_cached(share, password):
+                verdicts[index] = self.validate_share(share, password)
+                valid += verdicts[index]
+            else:
+                uncached.append(index)
+        if not uncached or (threshold is not None and valid >= threshold):
+            return verdicts
+
+        scheduler = scheduler or default_scheduler()
+        # validate_share derives the tag with the default Argon2 memory cost of generate_tag
+        futures = {scheduler.submit(self.validate_share, KDF_MEMORY_COST, shares[index], password): index
+                   for index in uncached}
+        pending = set(futures)
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                verdicts[futures[future]] = future.result()
+                if future.result():
+                    valid += 1
+            if threshold is not None and valid >= threshold:
+                for future in pending:
+                    future.cancel()
+                break
+        return verdicts
+
     # Validates generated secret
     # Returns True if secret is valid
     #         False otherwise
@@ -25,4 +77,8 @@ class SingleKeyValidator(Validator):
     # read only properties
     @property
     def commitment(self):
-        return self._commitment
\ No newline at end of file
+        return self._commitment
+
+    @property
+    def kdf_cache(self):
+        return self._kdf_cache
\ No newline at end of file
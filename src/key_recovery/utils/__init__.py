@@ -1,3 +1,8 @@
 from .pqhash import pqhash
 from .to_bytes import to_bytes
-from .conversion import to_hex_no_prefix, from_hex_no_prefix
\ No newline at end of file
+from .conversion import to_hex_no_prefix, from_hex_no_prefix
+from .kdf_scheduler import KDFScheduler, default_scheduler
+from .kdf_cache import KDFCache
+from .polynomial import evaluate_polynomial
+from .lagrange import batch_inverse, interpolate_at_zero
+from . import reed_solomon
\ No newline at end of file
@@ -0,0 +1,62 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+
+# Bounded LRU cache of KDF results
+# entries are keyed by commitment, share point, KDF parameters
+# and a digest of the password salted with a per-cache random salt,
+# so the cache never holds the password itself
+class KDFCache:
+    def __init__(self, maxsize: int = 1024):
+        self._maxsize = maxsize
+        self._salt = os.urandom(16)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, password: str, point: tuple[int, int], commitment: int, kdf_parameters: tuple) -> tuple:
+        password_digest = hashlib.sha3_256(self._salt + password.encode()).digest()
+        return (commitment, tuple(point), tuple(kdf_parameters), password_digest)
+
+    # Returns True if a result for the key is cached, without counting a hit or a miss
+    def __contains__(self, key: tuple) -> bool:
+        with self._lock:
+            return key in self._entries
+
+    # Returns the cached result for the key or computes it with compute()
+    def get(self, key: tuple, compute):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+
+        result = compute()
+        with self._lock:
+            self._entries[key] = result
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._maxsize:
+                self._entries.popitem(last=False)
+        return result
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "size": len(self._entries), "maxsize": self._maxsize}
+
+    # read only properties
+    @property
+    def maxsize(self) -> int:
+        return self._maxsize
+
+    def __len__(self) -> int:
+        return len(self._entries)
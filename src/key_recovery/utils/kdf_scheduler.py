@@ -0,0 +1,77 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, Future
+
+
+# Runs memory-hard KDF calls (Argon2) concurrently on a thread pool
+# argon2-cffi releases the GIL while hashing, so threads run in parallel
+# memory costs are in KiB, like the Argon2 memory_cost parameter,
+# and the costs of the running calls never exceed the memory budget
+class KDFScheduler:
+    def __init__(self, memory_budget: int = 2**18, max_workers: int = None):
+        self._memory_budget = memory_budget
+        self._memory_used = 0
+        self._memory_available = threading.Condition()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers or os.cpu_count() or 1)
+
+    # Schedules function(*args, **kwargs), which needs memory_cost KiB while it runs
+    # Returns a Future of the result
+    def submit(self, function, memory_cost: int, *args, **kwargs) -> Future:
+        return self._executor.submit(self._run, function, memory_cost, args, kwargs)
+
+    # Runs function on every tuple of arguments
+    # Returns the results in the order of the arguments
+    def map(self, function, memory_cost: int, arguments) -> list:
+        futures = [self.submit(function, memory_cost, *args) for args in arguments]
+        return [future.result() for future in futures]
+
+    def _run(self, function, memory_cost, args, kwargs):
+        self._acquire(memory_cost)
+        try:
+            return function(*args, **kwargs)
+        finally:
+            self._release(memory_cost)
+
+    def _acquire(self, memory_cost):
+        with self._memory_available:
+            # a call larger than the whole budget runs alone instead of waiting forever
+            while self._memory_used > 0 and self._memory_used + memory_cost > self._memory_budget:
+                self._memory_available.wait()
+            self._memory_used += memory_cost
+
+    def _release(self, memory_cost):
+        with self._memory_available:
+            self._memory_used -= memory_cost
+            self._memory_available.notify_all()
+
+    def shutdown(self, wait: bool = True):
+        self._executor.shutdown(wait=wait)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown()
+
+    # read only properties
+    @property
+    def memory_budget(self) -> int:
+        return self._memory_budget
+
+    @property
+    def memory_used(self) -> int:
+        return self._memory_used
+
+
+_default_scheduler = None
+_default_scheduler_lock = threading.Lock()
+
+
+# Returns the scheduler shared by every caller in the process,
+# so all concurrent KDF calls stay within one memory budget
+def default_scheduler() -> KDFScheduler:
+    global _default_scheduler
+    with _default_scheduler_lock:
+        if _default_scheduler is None:
+            _default_scheduler = KDFScheduler()
+        return _default_scheduler
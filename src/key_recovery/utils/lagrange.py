@@ -0,0 +1,45 @@
+from functools import lru_cache
+
+
+# Montgomery's trick: inverts every value modulo prime with a single modular inversion
+# Returns the list of inverses in the order of the values
+def batch_inverse(values: list[int], prime: int) -> list[int]:
+    # prefix[i] is the product of the first i values
+    prefix = [1]
+    for value in values:
+        prefix.append(prefix[-1] * value % prime)
+    inverse = pow(prefix[-1], -1, prime)
+    inverses = [0] * len(values)
+    for i in range(len(values) - 1, -1, -1):
+        inverses[i] = inverse * prefix[i] % prime
+        inverse = inverse * values[i] % prime
+    return inverses
+
+
+# Lagrange coefficients for the value at zero of the polynomial through the points with x values xs
+# secret = sum(c_i * y_i), with c_i = w_i * prod(-x_j) / (-x_i)
+# where w_i = 1 / prod_{j != i}(x_i - x_j) are the barycentric weights,
+# all denominators are inverted together, the coefficients are cached per x set
+@lru_cache(maxsize=256)
+def zero_coefficients(xs: tuple[int, ...], prime: int) -> tuple[int, ...]:
+    product = 1
+    for x in xs:
+        product = product * -x % prime
+    denominators = []
+    for i, xi in enumerate(xs):
+        denominator = -xi % prime
+        for j, xj in enumerate(xs):
+            if i != j:
+                denominator = denominator * (xi - xj) % prime
+        denominators.append(denominator)
+    return tuple(product * inverse % prime for inverse in batch_inverse(denominators, prime))
+
+
+# Value at zero of the polynomial through the points, modulo prime
+def interpolate_at_zero(points: list[tuple[int, int]], prime: int) -> int:
+    points = sorted((x % prime, y) for x, y in points)
+    # a point at zero is the value itself
+    if points[0][0] == 0:
+        return points[0][1] % prime
+    coefficients = zero_coefficients(tuple(x for x, _ in points), prime)
+    return sum(c * y for c, (_, y) in zip(coefficients, points)) % prime
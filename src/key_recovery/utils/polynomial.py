@@ -0,0 +1,130 @@
+import numpy as np
+
+# primes below this bound are evaluated with int64 arithmetic,
+# (p - 1)^2 + p - 1 must fit in a signed 64 bit integer
+WORD_PRIME_BOUND = 2**31
+# below this number of coefficients Horner's rule over Python integers is faster
+# than the subproduct tree (measured with 127 bit primes, the crossover is higher for larger primes)
+TREE_MIN_DEGREE = 2048
+# nodes of the remainder tree with this many points or fewer are evaluated directly
+_TREE_LEAF_SIZE = 16
+
+
+# Evaluates the polynomial (coefficients from c0 up) at every x
+# word sized primes use Horner's rule vectorized over all x with NumPy,
+# large primes with high degrees and at least as many points use subproduct tree multipoint evaluation,
+# otherwise Horner's rule runs over an object array of Python integers
+# Returns the list of values, reduced modulo prime if it is not None
+def evaluate_polynomial(polynomial: list[int], xs: list[int], prime: int = None) -> list[int]:
+    xs = list(xs)
+    if not xs:
+        return []
+    if prime is not None and prime < WORD_PRIME_BOUND:
+        return _horner_word(polynomial, xs, prime)
+    # the tree only pays off when there are at least as many points as coefficients
+    if prime is not None and len(polynomial) >= TREE_MIN_DEGREE and len(xs) >= len(polynomial):
+        return _subproduct_tree_evaluation(polynomial, xs, prime)
+    return _horner_object(polynomial, xs, prime)
+
+
+def _horner_word(polynomial, xs, prime):
+    x = np.array([x % prime for x in xs], dtype=np.int64)
+    result = np.zeros(len(xs), dtype=np.int64)
+    for coefficient in reversed(polynomial):
+        result = (result * x + coefficient % prime) % prime
+    return [int(value) for value in result]
+
+
+def _horner_object(polynomial, xs, prime):
+    x = np.array(xs, dtype=object)
+    result = np.zeros(len(xs), dtype=object)
+    for coefficient in reversed(polynomial):
+        result = result * x + coefficient
+        if prime is not None:
+            result %= prime
+    return [int(value) for value in result]
+
+
+# Polynomial arithmetic modulo prime, polynomials are lists of coefficients from c0 up
+
+# Multiplies polynomials with Kronecker substitution:
+# both are packed into one big integer, multiplied once and unpacked
+def multiply(a: list[int], b: list[int], prime: int) -> list[int]:
+    if not a or not b:
+        return []
+    slot = (2 * prime.bit_length() + min(len(a), len(b)).bit_length() + 7) // 8
+    product = _pack(a, slot) * _pack(b, slot)
+    data = product.to_bytes(slot * (len(a) + len(b) - 1), "little")
+    return [int.from_bytes(data[i:i + slot], "little") % prime for i in range(0, len(data), slot)]
+
+
+def _pack(polynomial, slot):
+    return int.from_bytes(b"".join(c.to_bytes(slot, "little") for c in polynomial), "little")
+
+
+# Inverse of the power series h (h[0] = 1) modulo X^k by Newton iteration
+def _inverse_series(h, k, prime):
+    g = [1]
+    precision = 1
+    while precision < k:
+        precision = min(2 * precision, k)
+        e = multiply(h[:precision], g, prime)[:precision]
+        e = [(-c) % prime for c in e]
+        e[0] = (e[0] + 2) % prime
+        g = multiply(g, e, prime)[:precision]
+    return g
+
+
+# Remainder of f divided by the monic polynomial m
+def remainder(f: list[int], m: list[int], prime: int) -> list[int]:
+    n = len(m) - 1
+    if len(f) <= n:
+        return f
+    k = len(f) - n
+    # the reversed quotient is the reversed f times the inverse of the reversed m
+    inverse = _inverse_series(m[::-1], k, prime)
+    quotient = multiply(f[::-1][:k], inverse, prime)[:k][::-1]
+    product = multiply(quotient, m, prime)
+    return [(f[i] - product[i]) % prime for i in range(n)]
+
+
+def _subproduct_tree(xs, prime):
+    # levels of the tree from the leaves (X - x) up to the product of all of them
+    levels = [[[(-x) % prime, 1] for x in xs]]
+    while len(levels[-1]) > 1:
+        level = levels[-1]
+        levels.append([multiply(level[i], level[i + 1], prime) if i + 1 < len(level) else level[i]
+                       for i in range(0, len(level), 2)])
+    return levels
+
+
+def _subproduct_tree_evaluation(polynomial, xs, prime):
+    polynomial = [c % prime for c in polynomial]
+    values = []
+    # points are evaluated in groups with at least as many points as coefficients,
+    # so the polynomial is never longer than twice the root of a group tree
+    group = max(len(polynomial), _TREE_LEAF_SIZE)
+    for start in range(0, len(xs), group):
+        values.extend(_evaluate_group(polynomial, xs[start:start + group], prime))
+    return values
+
+
+def _evaluate_group(polynomial, xs, prime):
+    levels = _subproduct_tree(xs, prime)
+    remainders = [remainder(polynomial, levels[-1][0], prime)]
+    for depth in range(len(levels) - 2, -1, -1):
+        span = 1 << depth
+        if span <= _TREE_LEAF_SIZE // 2:
+            # the remainders are short enough to evaluate directly
+            values = []
+            for node, r in enumerate(remainders):
+                points = xs[node * 2 * span:(node + 1) * 2 * span]
+                values.extend(_horner_object(r, points, prime))
+            return values
+        level = levels[depth]
+        children = []
+        for node, r in enumerate(remainders):
+            for child in level[2 * node:2 * node + 2]:
+                children.append(remainder(r, child, prime))
+        remainders = children
+    return _horner_object(remainders[0], xs, prime)
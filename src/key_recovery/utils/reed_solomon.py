@@ -0,0 +1,97 @@
+from .lagrange import batch_inverse
+from .polynomial import multiply
+
+
+# Polynomials modulo prime are lists of coefficients from c0 up, without trailing zeros
+
+def _trim(polynomial):
+    while polynomial and polynomial[-1] == 0:
+        polynomial.pop()
+    return polynomial
+
+
+def _subtract(a, b, prime):
+    result = [0] * max(len(a), len(b))
+    for i, c in enumerate(a):
+        result[i] = c
+    for i, c in enumerate(b):
+        result[i] = (result[i] - c) % prime
+    return _trim(result)
+
+
+# Long division of a by b
+# Returns (quotient, remainder)
+def _divmod(a, b, prime):
+    remainder = list(a)
+    if len(a) < len(b):
+        return [], _trim(remainder)
+    inverse = pow(b[-1], -1, prime)
+    quotient = [0] * (len(a) - len(b) + 1)
+    for i in range(len(quotient) - 1, -1, -1):
+        coefficient = remainder[i + len(b) - 1] * inverse % prime
+        quotient[i] = coefficient
+        if coefficient:
+            for j, c in enumerate(b):
+                remainder[i + j] = (remainder[i + j] - coefficient * c) % prime
+    return _trim(quotient), _trim(remainder[:len(b) - 1])
+
+
+def _evaluate(polynomial, x, prime):
+    value = 0
+    for c in reversed(polynomial):
+        value = (value * x + c) % prime
+    return value
+
+
+# Polynomial through all the points, with barycentric weights
+def _interpolate(points, prime):
+    vanishing = [1]
+    for x, _ in points:
+        vanishing = multiply(vanishing, [-x % prime, 1], prime)
+    weights = []
+    for i, (xi, _) in enumerate(points):
+        denominator = 1
+        for j, (xj, _) in enumerate(points):
+            if i != j:
+                denominator = denominator * (xi - xj) % prime
+        weights.append(denominator)
+    result = [0] * len(points)
+    for (x, y), weight in zip(points, batch_inverse(weights, prime)):
+        # vanishing / (X - x) by synthetic division
+        quotient, carry = [0] * len(points), 0
+        for k in range(len(points), 0, -1):
+            carry = (vanishing[k] + carry * x) % prime
+            quotient[k - 1] = carry
+        scale = y * weight % prime
+        for k, c in enumerate(quotient):
+            result[k] = (result[k] + scale * c) % prime
+    return vanishing, _trim(result)
+
+
+# Reed-Solomon decoding with Gao's algorithm
+# the points lie on a polynomial of degree below t, except up to (n - t) // 2 of them
+# Returns the polynomial (coefficients from c0 up) and the x values of the wrong points
+# Raises ValueError if there are too many wrong points to decode
+def decode(points: list[tuple[int, int]], t: int, prime: int) -> tuple[list[int], list[int]]:
+    points = [(x % prime, y % prime) for x, y in points]
+    n = len(points)
+    if n < t:
+        raise ValueError("Not enough shares to recover the key")
+    g0, g1 = _interpolate(points, prime)
+
+    # partial extended Euclidean algorithm, stopped once the remainder has degree below (n + t) / 2
+    r0, r1 = g0, g1
+    v0, v1 = [], [1]
+    while len(r1) - 1 >= (n + t) / 2:
+        quotient, remainder = _divmod(r0, r1, prime)
+        r0, r1 = r1, remainder
+        v0, v1 = v1, _subtract(v0, multiply(quotient, v1, prime), prime)
+
+    polynomial, remainder = _divmod(r1, v1, prime)
+    if remainder or len(polynomial) > t:
+        raise ValueError("Too many invalid shares to recover the key")
+    polynomial = polynomial or [0]
+    wrong = [x for x, y in points if _evaluate(polynomial, x, prime) != y]
+    if len(wrong) > (n - t) // 2:
+        raise ValueError("Too many invalid shares to recover the key")
+    return polynomial, wrong
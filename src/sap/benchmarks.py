@@ -0,0 +1,278 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+import numpy as np
+import kyber
+from ephemeral_log import EphemeralLogWriter, close_shared_writers
+from polynomial_ring import polynomial_ring, schoolbook_multiply
+from kyber_numpy import CIPHERTEXT_BYTES, PUBLIC_KEY_BYTES, PreparedPublicKey, encapsulate
+from public_key_cache import public_key_cache
+from recipient_registry import RecipientRegistry, close_shared_registries
+import pqsap_implementation as pqsap
+
+DEFAULT_SIZES = (1000, 10000, 100000)
+
+
+def _foreign_announcements(rows):
+    """
+    Generates announcements addressed to a recipient other than the scanner,
+    which is the common case a scanner has to reject.
+
+    :param rows: Number of announcements
+    :return: List of (ciphertext, shared_key) pairs
+    """
+    pk, _ = kyber.Kyber512.keygen()
+    return [kyber.Kyber512.enc(pk) for _ in range(rows)]
+
+
+def _time_scan(private_key, records):
+    """
+    Writes the records to a fresh ephemeral log and times a full scan of it.
+
+    :param private_key: Secret key of the scanning recipient
+    :param records: List of record field tuples
+    :return: Seconds spent per row
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "ephemeral_registry.log")
+        with EphemeralLogWriter(path) as writer:
+            writer.append_many(records)
+        start = time.perf_counter()
+        pqsap.scan_for_stealth_address(private_key, path)
+        return (time.perf_counter() - start) / len(records)
+
+
+def benchmark_view_tag_scan(rows=200):
+    """
+    Compares the per-row cost of the original scan, a full kyber-py
+    decapsulation of every row, with the current scanner on announcements that
+    carry a 1-byte view tag (rows are rejected after the batch CPA decryption).
+
+    :param rows: Number of announcements in the registry
+    :return: Dictionary with the per-row cost in seconds for both modes
+    """
+    _, sk = kyber.Kyber512.keygen()
+    announcements = _foreign_announcements(rows)
+
+    start = time.perf_counter()
+    for ciphertext, shared_key in announcements:
+        kyber.Kyber512.dec(ciphertext, sk) == shared_key
+    full_decapsulation = (time.perf_counter() - start) / rows
+    view_tag = _time_scan(sk, [(ciphertext, pqsap.compute_view_tag(shared_key)) for ciphertext, shared_key in announcements])
+
+    print(f"=== View tag scan benchmark ({rows} rows) ===")
+    print(f"Full decapsulation per row: {full_decapsulation * 1e3:.3f} ms/row")
+    print(f"Batch view tag scan: {view_tag * 1e3:.3f} ms/row")
+    print(f"Speedup: {full_decapsulation / view_tag:.2f}x")
+    print()
+    return {"full_decapsulation": full_decapsulation, "view_tag": view_tag}
+
+
+def benchmark_repeat_encapsulation(sends=100):
+    """
+    Per-send latency of repeated payments to the same recipient: kyber-py
+    encapsulation, which decodes the key and expands A on every call, against
+    encapsulation with a prepared public key, one send at a time and batched.
+
+    :param sends: Number of sends to the recipient
+    :return: Dictionary with the per-send latency in seconds
+    """
+    pk, _ = kyber.Kyber512.keygen()
+
+    start = time.perf_counter()
+    for _ in range(sends):
+        kyber.Kyber512.enc(pk)
+    kyber_py = (time.perf_counter() - start) / sends
+
+    start = time.perf_counter()
+    prepared = PreparedPublicKey(pk)
+    prepare = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for _ in range(sends):
+        encapsulate(prepared)
+    single = (time.perf_counter() - start) / sends
+
+    start = time.perf_counter()
+    encapsulate(prepared, sends)
+    batched = (time.perf_counter() - start) / sends
+
+    print(f"=== Repeat recipient encapsulation benchmark ({sends} sends) ===")
+    print(f"kyber-py: {kyber_py * 1e3:.3f} ms/send")
+    print(f"Preparing the public key: {prepare * 1e3:.3f} ms once")
+    print(f"Prepared public key: {single * 1e3:.3f} ms/send")
+    print(f"Prepared public key, batched: {batched * 1e3:.3f} ms/send")
+    print()
+    return {"kyber_py": kyber_py, "prepare": prepare, "prepared": single, "prepared_batched": batched}
+
+
+def benchmark_ring_multiplication(n=256, q=3329, k=2, instances=16):
+    """
+    Cost of the module product A s used by module-LWE generation and validation,
+    with the NTT engine against schoolbook multiplication.
+
+    :param n: Dimension of the polynomial ring
+    :param q: Modulus
+    :param k: Module rank
+    :param instances: Number of instances multiplied in one call
+    :return: Dictionary with the per-instance cost in seconds for both engines
+    """
+    rng = np.random.default_rng(42)
+    ring = polynomial_ring(n, q)
+    A = rng.integers(0, q, size=(instances, k, k, n))
+    s = rng.integers(0, q, size=(instances, k, n))
+
+    start = time.perf_counter()
+    expected = schoolbook_multiply(A, s[:, None, :, :], q).sum(axis=-2) % q
+    schoolbook = (time.perf_counter() - start) / instances
+
+    start = time.perf_counter()
+    product = ring.intt(ring.matrix_vector(ring.ntt(A), ring.ntt(s)))
+    ntt = (time.perf_counter() - start) / instances
+    assert np.array_equal(product, expected)
+
+    print(f"=== Module product benchmark (n={n}, q={q}, k={k}, {instances} instances) ===")
+    print(f"Schoolbook: {schoolbook * 1e3:.3f} ms/instance")
+    print(f"NTT: {ntt * 1e3:.3f} ms/instance")
+    print(f"Speedup: {schoolbook / ntt:.2f}x")
+    print()
+    return {"schoolbook": schoolbook, "ntt": ntt}
+
+
+def _synthetic_announcements(rows, public_key, matches=4):
+    """
+    Builds a synthetic registry: random ciphertexts and view tags, which a
+    scanner cannot tell apart from payments to other recipients, with a few
+    real payments to `public_key` spread over the registry.
+
+    :param rows: Number of announcements
+    :param public_key: Public key of the scanning recipient
+    :param matches: Number of real payments to the recipient
+    :return: List of (ciphertext, view_tag, rk) tuples
+    """
+    announcements = [(os.urandom(CIPHERTEXT_BYTES), os.urandom(1), os.urandom(32)) for _ in range(rows)]
+    for row in np.linspace(0, rows - 1, num=min(matches, rows), dtype=int):
+        ciphertext, shared_key = kyber.Kyber512.enc(public_key)
+        announcements[row] = (ciphertext, pqsap.compute_view_tag(shared_key), os.urandom(32))
+    return announcements
+
+
+def _quiet():
+    # the registry facades print one line per call
+    return contextlib.redirect_stdout(io.StringIO())
+
+
+def _benchmark_registration(directory, announcements, single_rows=1000):
+    single = announcements[:single_rows]
+    path = os.path.join(directory, "single.log")
+    with _quiet():
+        start = time.perf_counter()
+        for ciphertext, view_tag, rk in single:
+            pqsap.register_ephemeral_key(ciphertext, view_tag, path, rk=rk)
+        single_time = time.perf_counter() - start
+
+        path = os.path.join(directory, "group.log")
+        start = time.perf_counter()
+        pqsap.register_ephemeral_keys(announcements, path)
+        group_time = time.perf_counter() - start
+    return {
+        "single_announcements_per_second": len(single) / single_time,
+        "group_announcements_per_second": len(announcements) / group_time,
+    }
+
+
+def _benchmark_public_key_lookup(directory, recipients, lookups=1000):
+    path = os.path.join(directory, "registry.db")
+    with RecipientRegistry(path) as registry:
+        registry.register_many((f"recipient-{i}", os.urandom(PUBLIC_KEY_BYTES)) for i in range(recipients))
+    recipient_ids = [f"recipient-{random.randrange(recipients)}" for _ in range(lookups)]
+
+    public_key_cache.invalidate()
+    start = time.perf_counter()
+    for recipient_id in recipient_ids:
+        public_key_cache.invalidate(path)
+        pqsap.retrieve_public_key(recipient_id, path)
+    uncached = (time.perf_counter() - start) / lookups
+
+    start = time.perf_counter()
+    for recipient_id in recipient_ids:
+        pqsap.retrieve_public_key(recipient_id, path)
+    cached = (time.perf_counter() - start) / lookups
+    return {"retrieve_public_key_seconds": uncached, "retrieve_public_key_cached_seconds": cached}
+
+
+def _benchmark_scan(path, private_key, rows):
+    start = time.perf_counter()
+    found = sum(1 for _ in pqsap.iter_stealth_addresses(private_key, path))
+    elapsed = time.perf_counter() - start
+
+    tracemalloc.start()
+    for _ in pqsap.iter_stealth_addresses(private_key, path):
+        pass
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"matches": found, "scan_rows_per_second": rows / elapsed, "scan_peak_memory_bytes": peak}
+
+
+def benchmark_scaling(sizes=DEFAULT_SIZES):
+    """
+    Measures how registration, public key lookups and scanning scale with the
+    size of the registries.
+
+    :param sizes: Numbers of announcements (and recipients) to benchmark
+    :return: Dictionary with the results, ready to be dumped as JSON
+    """
+    pk, sk = kyber.Kyber512.keygen()
+    results = []
+    for rows in sizes:
+        with tempfile.TemporaryDirectory() as directory:
+            announcements = _synthetic_announcements(rows, pk)
+            result = {"rows": rows}
+            result.update(_benchmark_registration(directory, announcements))
+            result.update(_benchmark_public_key_lookup(directory, rows))
+            result.update(_benchmark_scan(os.path.join(directory, "group.log"), sk, rows))
+            close_shared_writers()
+            close_shared_registries()
+        results.append(result)
+        print(f"{rows} rows: {result['scan_rows_per_second']:.0f} rows/s scanned", file=sys.stderr)
+
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "results": results,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmarks of the stealth address protocol")
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(DEFAULT_SIZES),
+                        help="registry sizes to benchmark")
+    parser.add_argument("--output", help="write the JSON results to this file instead of stdout")
+    parser.add_argument("--view-tag", action="store_true", help="run the view tag scan benchmark instead")
+    parser.add_argument("--encapsulation", action="store_true", help="run the repeat recipient encapsulation benchmark instead")
+    parser.add_argument("--ring", action="store_true", help="run the module-LWE ring multiplication benchmark instead")
+    args = parser.parse_args()
+
+    if args.view_tag:
+        benchmark_view_tag_scan()
+    elif args.encapsulation:
+        benchmark_repeat_encapsulation()
+    elif args.ring:
+        benchmark_ring_multiplication()
+    else:
+        report = json.dumps(benchmark_scaling(args.sizes), indent=2)
+        if args.output:
+            with open(args.output, "w") as f:
+                f.write(report + "\n")
+        else:
+            print(report)
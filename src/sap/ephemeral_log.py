@@ -0,0 +1,336 @@
+import atexit
+import mmap
+import os
+import struct
+import threading
+import time
+from contextlib import contextmanager
+from typing import NamedTuple
+
+try:
+    import fcntl
+except ImportError:
+    # no advisory file locks (Windows), only a single writer process is safe
+    fcntl = None
+
+MAGIC = b"PQSAPEL1"
+HEADER_SIZE = len(MAGIC)
+
+# every record is a 4 byte payload length followed by the payload,
+# the payload is a sequence of fields, each prefixed with its 2 byte length
+_RECORD_LENGTH = struct.Struct(">I")
+_FIELD_LENGTH = struct.Struct(">H")
+
+
+class EphemeralRecord(NamedTuple):
+    index: int
+    offset: int
+    ciphertext: bytes
+    view_tag: bytes
+    end: int
+    rk: bytes
+
+
+def encode_record(*fields) -> bytes:
+    """
+    Encodes the fields of one announcement as a length-prefixed record.
+
+    :param fields: Byte strings stored in the record, in order
+    :return: Record bytes ready to be appended to the log
+    """
+    payload = b"".join(_FIELD_LENGTH.pack(len(field)) + bytes(field) for field in fields)
+    return _RECORD_LENGTH.pack(len(payload)) + payload
+
+
+def decode_fields(buffer, start: int, end: int) -> list[bytes]:
+    """
+    Splits a record payload back into its fields.
+
+    :param buffer: Buffer holding the payload (bytes or mmap)
+    :param start: Offset of the first payload byte
+    :param end: Offset one past the last payload byte
+    :return: List of fields
+    """
+    fields = []
+    while start < end:
+        (length,) = _FIELD_LENGTH.unpack_from(buffer, start)
+        start += _FIELD_LENGTH.size
+        fields.append(buffer[start:start + length])
+        start += length
+    return fields
+
+
+def _check_header(header: bytes, path: str):
+    if header != MAGIC:
+        raise ValueError(f"{path} is not an ephemeral log file.")
+
+
+def _valid_size(f, size: int) -> int:
+    # walks the length prefixes and returns the size of the log
+    # up to the last complete record (a crash can leave a torn tail)
+    offset = HEADER_SIZE
+    while offset + _RECORD_LENGTH.size <= size:
+        f.seek(offset)
+        (length,) = _RECORD_LENGTH.unpack(f.read(_RECORD_LENGTH.size))
+        if offset + _RECORD_LENGTH.size + length > size:
+            break
+        offset += _RECORD_LENGTH.size + length
+    return offset
+
+
+@contextmanager
+def exclusive_lock(fd: int):
+    # exclusive lock shared by the writers of every process, held while the end of the log changes
+    if fcntl is None:
+        yield
+        return
+    fcntl.flock(fd, fcntl.LOCK_EX)
+    try:
+        yield
+    finally:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+
+
+def _write_all(fd: int, data: bytes):
+    # os.write may write only part of the data
+    view = memoryview(data)
+    while view:
+        view = view[os.write(fd, view):]
+
+
+class EphemeralLogWriter:
+    """
+    Append-only writer for the binary ephemeral registry.
+
+    Every append is a single O(1) write at the end of the file. Durability is
+    batched: the file is fsynced once every `fsync_every` records or once
+    `fsync_interval` seconds have passed since the last sync, whichever comes first.
+    """
+
+    def __init__(self, path: str, fsync_every: int = 64, fsync_interval: float = 1.0):
+        self._path = path
+        self._fsync_every = fsync_every
+        self._fsync_interval = fsync_interval
+        self._pending = 0
+        self._last_sync = time.monotonic()
+        # flock only excludes other processes, threads sharing this writer take this lock first
+        self._lock = threading.RLock()
+
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT | os.O_APPEND, 0o644)
+        # under the lock a short file is a torn tail, not a group append of another process
+        with exclusive_lock(self._fd):
+            size = os.fstat(self._fd).st_size
+            if size == 0:
+                _write_all(self._fd, MAGIC)
+                os.fsync(self._fd)
+            else:
+                with open(path, "rb") as f:
+                    _check_header(f.read(HEADER_SIZE), path)
+                    valid = _valid_size(f, size)
+                if valid != size:
+                    os.ftruncate(self._fd, valid)
+
+    def append(self, *fields) -> int:
+        """
+        Appends one announcement to the log.
+
+        :param fields: Byte strings of the announcement (ciphertext, view tag, ...)
+        :return: Offset at which the record was written
+        """
+        return self.append_many([fields])[0]
+
+    def append_many(self, records) -> list[int]:
+        """
+        Appends several announcements with a single write.
+
+        :param records: Iterable of field tuples
+        :return: Offsets of the written records, in order
+        """
+        chunks = [encode_record(*fields) for fields in records]
+        offsets = []
+        with self._lock:
+            with exclusive_lock(self._fd):
+                offset = os.lseek(self._fd, 0, os.SEEK_END)
+                for record in chunks:
+                    offsets.append(offset)
+                    offset += len(record)
+                _write_all(self._fd, b"".join(chunks))
+            self._pending += len(offsets)
+            if (self._pending >= self._fsync_every
+                    or time.monotonic() - self._last_sync >= self._fsync_interval):
+                self.flush()
+        with _appended:
+            _appended.notify_all()
+        return offsets
+
+    def flush(self):
+        with self._lock:
+            if self._pending:
+                os.fsync(self._fd)
+                self._pending = 0
+            self._last_sync = time.monotonic()
+
+    def close(self):
+        with self._lock:
+            if self._fd is None:
+                return
+            self.flush()
+            os.close(self._fd)
+            self._fd = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @property
+    def path(self) -> str:
+        return self._path
+
+
+class EphemeralLogReader:
+    """
+    Memory-mapped reader for the binary ephemeral registry.
+
+    The reader sees the log as it was when it was opened, records appended
+    afterwards require a new reader.
+    """
+
+    def __init__(self, path: str):
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"Ephemeral registry file {path} not found.")
+        self._path = path
+        self._map = None
+        with open(path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            if size > 0:
+                self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                _check_header(self._map[:HEADER_SIZE], path)
+        self._size = size
+
+    def records(self, start_offset: int = HEADER_SIZE, start_index: int = 0, limit: int = None):
+        """
+        Iterates over the records of the log.
+
+        :param start_offset: Byte offset of the first record to read
+        :param start_index: Index assigned to the first record read
+        :param limit: Maximum number of records to read, None reads to the end
+        :return: Generator of EphemeralRecord
+        """
+        for index, offset, start, end in self._spans(start_offset, start_index, limit):
+            fields = decode_fields(self._map, start, end)
+            # records written without the sender randomness have two fields
+            rk = fields[2] if len(fields) > 2 else b""
+            yield EphemeralRecord(index, offset, fields[0], fields[1], end, rk)
+
+    def chunks(self, chunk_size: int):
+        """
+        Splits the log into chunks of consecutive records without decoding them.
+
+        :param chunk_size: Number of records per chunk
+        :return: List of (start_offset, start_index, count) tuples
+        """
+        chunks = []
+        for index, offset, _, _ in self._spans(HEADER_SIZE, 0, None):
+            if index % chunk_size == 0:
+                chunks.append([offset, index, 0])
+            chunks[-1][2] += 1
+        return [tuple(chunk) for chunk in chunks]
+
+    def count(self) -> int:
+        """
+        :return: Number of complete records in the log
+        """
+        return sum(1 for _ in self._spans(HEADER_SIZE, 0, None))
+
+    def _spans(self, offset, index, limit):
+        # walks the length prefixes, yielding (index, offset, payload start, payload end)
+        if self._map is None:
+            return
+        stop = None if limit is None else index + limit
+        while offset + _RECORD_LENGTH.size <= self._size and index != stop:
+            (length,) = _RECORD_LENGTH.unpack_from(self._map, offset)
+            start = offset + _RECORD_LENGTH.size
+            end = start + length
+            if end > self._size:
+                break
+            yield index, offset, start, end
+            offset, index = end, index + 1
+
+    def read(self, start: int, end: int) -> bytes:
+        if self._map is None:
+            return b""
+        return self._map[start:end]
+
+    def __iter__(self):
+        return self.records()
+
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+
+# notified on every append made by a writer of this process
+_appended = threading.Condition()
+
+
+def wait_for_growth(path: str, size: int, timeout: float) -> bool:
+    """
+    Blocks until the log grows past `size` bytes or the timeout expires.
+
+    Appends made in this process wake the waiter immediately, appends made by
+    other processes are noticed through the file size.
+
+    :param path: Path of the log
+    :param size: Size of the log already consumed by the caller
+    :param timeout: Maximum number of seconds to wait
+    :return: True if the log grew
+    """
+    def grown():
+        return os.path.exists(path) and os.path.getsize(path) > size
+
+    deadline = time.monotonic() + timeout
+    with _appended:
+        while not grown():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            _appended.wait(min(remaining, 0.1))
+    return True
+
+
+# writers shared by every caller in this process, one per log file
+_shared_writers = {}
+_shared_writers_lock = threading.Lock()
+
+
+def shared_writer(path: str) -> EphemeralLogWriter:
+    key = os.path.abspath(path)
+    with _shared_writers_lock:
+        writer = _shared_writers.get(key)
+        if writer is None:
+            writer = EphemeralLogWriter(path)
+            _shared_writers[key] = writer
+        return writer
+
+
+def close_shared_writers():
+    with _shared_writers_lock:
+        for writer in _shared_writers.values():
+            writer.close()
+        _shared_writers.clear()
+
+
+atexit.register(close_shared_writers)
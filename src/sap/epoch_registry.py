@@ -0,0 +1,368 @@
+import atexit
+import json
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from typing import NamedTuple
+from ephemeral_log import EphemeralLogReader, EphemeralLogWriter, exclusive_lock
+from stealth_scan import Announcement
+
+MANIFEST = "manifest.json"
+MANIFEST_LOCK = "manifest.lock"
+ARCHIVE_DIRECTORY = "archive"
+DEFAULT_EPOCH_SECONDS = 3600
+
+_OPEN_SEGMENT = re.compile(r"segment-(\d+)\.log")
+
+
+class Segment(NamedTuple):
+    first_epoch: int
+    last_epoch: int
+    path: str
+    # None while the segment is still open for appends
+    count: int
+    # "open", "sealed", "archived" or "pruned"
+    state: str
+
+
+def segment_name(first_epoch: int, last_epoch: int = None) -> str:
+    if last_epoch is None or last_epoch == first_epoch:
+        return f"segment-{first_epoch:010d}.log"
+    return f"segment-{first_epoch:010d}-{last_epoch:010d}.log"
+
+
+def is_epoch_registry(path) -> bool:
+    return str(path).lower().endswith(".epochs")
+
+
+class EpochRegistry:
+    """
+    Ephemeral registry partitioned into one binary log segment per epoch.
+
+    Writers append to the segment of the current epoch. The manifest records
+    the sealed segments with their announcement counts, so announcement
+    indices stay the same when older segments are moved, merged or removed,
+    and scans never count the records of sealed segments. A writer that moves
+    to a new epoch seals the segments that ended at least one full epoch ago,
+    so at most the segment of the previous epoch is left open for late writers.
+    Maintenance (archive, compact, prune) only touches sealed epochs, and every
+    manifest update holds an exclusive lock shared by all processes.
+    """
+
+    def __init__(self, path: str, epoch_seconds: int = DEFAULT_EPOCH_SECONDS):
+        self._path = path
+        self._manifest_path = os.path.join(path, MANIFEST)
+        if not os.path.exists(self._manifest_path):
+            os.makedirs(path, exist_ok=True)
+            self._save_manifest({"epoch_seconds": epoch_seconds, "segments": []})
+        # the window of an existing registry is fixed by its manifest
+        self.epoch_seconds = self._load_manifest()["epoch_seconds"]
+        self._writer = None
+        self._writer_epoch = None
+        self._lock = threading.RLock()
+        self._lock_file = None
+
+    @contextmanager
+    def _locked(self):
+        # manifest updates are serialized across threads and processes, the lock is reentrant
+        # so maintenance can seal while holding it
+        with self._lock:
+            if self._lock_file is not None:
+                yield
+                return
+            with open(os.path.join(self._path, MANIFEST_LOCK), "a") as self._lock_file:
+                try:
+                    with exclusive_lock(self._lock_file.fileno()):
+                        yield
+                finally:
+                    self._lock_file = None
+
+    def _load_manifest(self) -> dict:
+        with open(self._manifest_path) as f:
+            return json.load(f)
+
+    def _save_manifest(self, manifest: dict):
+        temporary = self._manifest_path + ".tmp"
+        with open(temporary, "w") as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(temporary, self._manifest_path)
+
+    def epoch(self, timestamp: float = None) -> int:
+        return int((time.time() if timestamp is None else timestamp) // self.epoch_seconds)
+
+    def segments(self) -> list:
+        """
+        :return: List of every Segment of the registry, in epoch order
+        """
+        segments = [
+            Segment(entry["first_epoch"], entry["last_epoch"],
+                    None if entry["file"] is None else os.path.join(self._path, entry["file"]),
+                    entry["count"], entry["state"])
+            for entry in self._load_manifest()["segments"]
+        ]
+        sealed = list(segments)
+        for name in os.listdir(self._path):
+            match = _OPEN_SEGMENT.fullmatch(name)
+            if match is None:
+                continue
+            epoch = int(match.group(1))
+            # files left behind by an interrupted compaction or prune are covered by the manifest
+            if any(segment.first_epoch <= epoch <= segment.last_epoch for segment in sealed):
+                continue
+            segments.append(Segment(epoch, epoch, os.path.join(self._path, name), None, "open"))
+        return sorted(segments, key=lambda segment: segment.first_epoch)
+
+    def _save_segments(self, segments):
+        manifest = self._load_manifest()
+        manifest["segments"] = [
+            {"first_epoch": segment.first_epoch, "last_epoch": segment.last_epoch,
+             "file": None if segment.path is None else os.path.relpath(segment.path, self._path),
+             "count": segment.count, "state": segment.state}
+            for segment in segments if segment.state != "open"
+        ]
+        self._save_manifest(manifest)
+
+    def append_many(self, announcements, timestamp: float = None) -> list:
+        """
+        Appends announcements to the segment of the epoch of `timestamp`.
+
+        :param announcements: Iterable of field tuples (ciphertext, view_tag[, rk])
+        :param timestamp: Time of the announcements, defaults to now
+        :return: Offsets of the written records within the segment
+        """
+        epoch = self.epoch(timestamp)
+        if epoch != self._writer_epoch:
+            if any(segment.state != "open" and segment.last_epoch >= epoch for segment in self.segments()):
+                raise ValueError(f"Epoch {epoch} is already sealed.")
+            if self._writer is not None:
+                self._writer.close()
+                # the count of every segment that can no longer grow is recorded once,
+                # instead of being counted again by every scan
+                self.seal(epoch)
+            self._writer = EphemeralLogWriter(os.path.join(self._path, segment_name(epoch)))
+            self._writer_epoch = epoch
+        offsets = self._writer.append_many(announcements)
+        self._writer.flush()
+        return offsets
+
+    def select(self, start_epoch: int = None, end_epoch: int = None, include_archived: bool = False) -> list:
+        """
+        Selects the readable segments overlapping an epoch range.
+
+        :param start_epoch: First epoch of the range, None starts at the oldest segment
+        :param end_epoch: Last epoch of the range, None ends at the newest segment
+        :param include_archived: Also select archived segments
+        :return: List of (first_index, Segment)
+        """
+        segments = self.segments()
+        selected = []
+        first_index = 0
+        for position, segment in enumerate(segments):
+            if ((start_epoch is None or segment.last_epoch >= start_epoch)
+                    and (end_epoch is None or segment.first_epoch <= end_epoch)
+                    and segment.state != "pruned"
+                    and (include_archived or segment.state != "archived")):
+                selected.append((first_index, segment))
+            if position + 1 < len(segments):
+                first_index += segment.count if segment.count is not None else _count(segment.path)
+        return selected
+
+    def announcements(self, start_epoch: int = None, end_epoch: int = None, include_archived: bool = False):
+        """
+        :return: Generator of Announcement from the segments overlapping the epoch range
+        """
+        for first_index, segment in self.select(start_epoch, end_epoch, include_archived):
+            with EphemeralLogReader(segment.path) as reader:
+                for record in reader.records(start_index=first_index):
+                    yield Announcement(record.index, record.ciphertext, record.view_tag, record.rk)
+
+    def _maintenance_limit(self, before_epoch):
+        # the previous epoch can still receive appends from writers with a late clock
+        limit = self.epoch() - 1
+        return limit if before_epoch is None else min(before_epoch, limit)
+
+    def seal(self, before_epoch: int = None) -> list:
+        """
+        Records the announcement counts of the open segments that ended before `before_epoch`.
+
+        :return: List of every Segment after sealing
+        """
+        with self._locked():
+            before_epoch = self._maintenance_limit(before_epoch)
+            segments = self.segments()
+            sealed = [
+                segment._replace(count=_count(segment.path), state="sealed")
+                if segment.state == "open" and segment.last_epoch < before_epoch else segment
+                for segment in segments
+            ]
+            if sealed != segments:
+                self._save_segments(sealed)
+            return sealed
+
+    def archive(self, before_epoch: int = None) -> int:
+        """
+        Moves the segments that ended before `before_epoch` to the archive directory,
+        archived segments are only scanned on request.
+
+        :return: Number of archived segments
+        """
+        with self._locked():
+            before_epoch = self._maintenance_limit(before_epoch)
+            segments = self.seal(before_epoch)
+            archive = os.path.join(self._path, ARCHIVE_DIRECTORY)
+            os.makedirs(archive, exist_ok=True)
+            archived = 0
+            for position, segment in enumerate(segments):
+                if segment.state == "sealed" and segment.last_epoch < before_epoch:
+                    path = os.path.join(archive, os.path.basename(segment.path))
+                    os.replace(segment.path, path)
+                    segments[position] = segment._replace(path=path, state="archived")
+                    self._save_segments(segments)
+                    archived += 1
+            return archived
+
+    def compact(self, before_epoch: int = None) -> int:
+        """
+        Merges runs of consecutive sealed segments that ended before `before_epoch`
+        into one segment each.
+
+        :return: Number of segments merged away
+        """
+        with self._locked():
+            before_epoch = self._maintenance_limit(before_epoch)
+            segments = self.seal(before_epoch)
+            runs = [[]]
+            for segment in segments:
+                if segment.state == "sealed" and segment.last_epoch < before_epoch:
+                    runs[-1].append(segment)
+                elif runs[-1]:
+                    runs.append([])
+
+            merged = 0
+            for run in runs:
+                if len(run) < 2:
+                    continue
+                path = os.path.join(self._path, segment_name(run[0].first_epoch, run[-1].last_epoch))
+                temporary = path + ".tmp"
+                if os.path.exists(temporary):
+                    os.remove(temporary)
+                with EphemeralLogWriter(temporary) as writer:
+                    for segment in run:
+                        with EphemeralLogReader(segment.path) as reader:
+                            writer.append_many(
+                                (record.ciphertext, record.view_tag, record.rk) if record.rk
+                                else (record.ciphertext, record.view_tag)
+                                for record in reader
+                            )
+                os.replace(temporary, path)
+
+                position = segments.index(run[0])
+                segments[position:position + len(run)] = [
+                    Segment(run[0].first_epoch, run[-1].last_epoch, path, sum(segment.count for segment in run), "sealed")
+                ]
+                # the manifest is switched before the old files are removed
+                self._save_segments(segments)
+                for segment in run:
+                    os.remove(segment.path)
+                merged += len(run) - 1
+            return merged
+
+    def prune(self, before_epoch: int) -> int:
+        """
+        Deletes the segments that ended before `before_epoch`, their counts are kept
+        so the indices of later announcements do not change.
+
+        :return: Number of pruned segments
+        """
+        with self._locked():
+            before_epoch = self._maintenance_limit(before_epoch)
+            segments = self.seal(before_epoch)
+            removed = []
+            for position, segment in enumerate(segments):
+                if segment.state in ("sealed", "archived") and segment.last_epoch < before_epoch:
+                    removed.append(segment.path)
+                    segments[position] = segment._replace(path=None, state="pruned")
+            self._save_segments(segments)
+            for path in removed:
+                os.remove(path)
+            return len(removed)
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+            self._writer_epoch = None
+
+
+def _count(path) -> int:
+    with EphemeralLogReader(path) as reader:
+        return reader.count()
+
+
+# registries shared by every caller in this process, one per directory
+_shared_registries = {}
+
+
+def shared_epoch_registry(path: str) -> EpochRegistry:
+    key = os.path.abspath(path)
+    registry = _shared_registries.get(key)
+    if registry is None:
+        registry = EpochRegistry(path)
+        _shared_registries[key] = registry
+    return registry
+
+
+def close_shared_epoch_registries():
+    for registry in _shared_registries.values():
+        registry.close()
+    _shared_registries.clear()
+
+
+atexit.register(close_shared_epoch_registries)
+
+
+def test_epoch_registry():
+    """
+    Tests that announcement indices stay the same across seal, compact, archive and prune.
+    """
+    directory = tempfile.mkdtemp()
+    try:
+        registry = EpochRegistry(os.path.join(directory, "test.epochs"), epoch_seconds=3600)
+        # epochs long past, so every one of them can be maintained
+        for epoch in range(100, 106):
+            registry.append_many([(os.urandom(768), os.urandom(1), os.urandom(32)) for _ in range(3)],
+                                 timestamp=epoch * 3600)
+        expected = {announcement.index: announcement.ciphertext for announcement in registry.announcements()}
+
+        def unchanged(**kwargs):
+            return all(expected[announcement.index] == announcement.ciphertext
+                       for announcement in registry.announcements(**kwargs))
+
+        states = [segment.state for segment in registry.segments()]
+        print("Segments sealed when the writer moves to a new epoch:",
+              "PASS" if states == ["sealed"] * 5 + ["open"] else "FAIL")
+        window = [announcement.index for announcement in registry.announcements(103, 104)]
+        print("Epoch window indices:", "PASS" if window == list(range(9, 15)) else "FAIL")
+
+        merged = registry.compact(before_epoch=103)
+        print("Compaction keeps indices:", "PASS" if merged == 2 and unchanged() else "FAIL")
+        archived = registry.archive(before_epoch=104)
+        indices = [announcement.index for announcement in registry.announcements()]
+        print("Archiving keeps indices:", "PASS" if archived == 2 and indices == list(range(12, 18))
+              and unchanged(include_archived=True) and len(expected) == 18 else "FAIL")
+        pruned = registry.prune(before_epoch=105)
+        indices = [announcement.index for announcement in registry.announcements(include_archived=True)]
+        print("Pruning keeps indices:", "PASS" if pruned == 3 and indices == list(range(15, 18))
+              and unchanged() else "FAIL")
+        registry.close()
+    finally:
+        shutil.rmtree(directory)
+    print("-" * 50)
+
+
+if __name__ == "__main__":
+    test_epoch_registry()
@@ -0,0 +1,133 @@
+import os
+import sqlite3
+from typing import NamedTuple
+from crypto.Hash import SHA3_256
+from ephemeral_log import HEADER_SIZE, EphemeralLogReader, wait_for_growth
+from stealth_scan import Announcement, match_announcements
+
+# number of bytes before the cursor covered by its checksum
+TAIL_SIZE = 64
+
+
+class ScanCursor(NamedTuple):
+    offset: int
+    index: int
+    tail_checksum: str
+
+
+def key_id(private_key) -> str:
+    # cursors are stored under a digest of the key, never the key itself
+    return SHA3_256.new(b"scan cursor" + private_key).hexdigest()[:32]
+
+
+def _tail_checksum(reader, offset) -> str:
+    return SHA3_256.new(reader.read(max(HEADER_SIZE, offset - TAIL_SIZE), offset)).hexdigest()
+
+
+class CursorStore:
+    """
+    Persists one scan cursor per secret key in an SQLite table.
+
+    Every save is a single-row upsert in its own transaction, so scanners in
+    different processes that share the store never overwrite the cursors of
+    other keys, and a save costs the same with one key or thousands.
+    """
+
+    def __init__(self, path: str):
+        self._path = path
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS cursors ("
+            "key TEXT PRIMARY KEY, "
+            "offset INTEGER NOT NULL, "
+            "idx INTEGER NOT NULL, "
+            "tail_checksum TEXT NOT NULL"
+            ") WITHOUT ROWID"
+        )
+        self._connection.commit()
+
+    def load(self, key: str):
+        row = self._connection.execute(
+            "SELECT offset, idx, tail_checksum FROM cursors WHERE key = ?", (key,)
+        ).fetchone()
+        return None if row is None else ScanCursor(*row)
+
+    def save(self, key: str, cursor: ScanCursor):
+        with self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO cursors (key, offset, idx, tail_checksum) VALUES (?, ?, ?, ?)",
+                (key, cursor.offset, cursor.index, cursor.tail_checksum),
+            )
+
+    def reset(self, key: str):
+        with self._connection:
+            self._connection.execute("DELETE FROM cursors WHERE key = ?", (key,))
+
+    def close(self):
+        self._connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _resume_point(reader, cursor):
+    # the cursor is only trusted if the bytes it was taken after are still there,
+    # a truncated or rewritten log is scanned again from the start
+    if (cursor is None or cursor.offset > reader.size
+            or _tail_checksum(reader, cursor.offset) != cursor.tail_checksum):
+        return HEADER_SIZE, 0
+    return cursor.offset, cursor.index
+
+
+def scan_new_announcements(private_key, ephemeral_registry_file="ephemeral_registry.log", cursor_file=None):
+    """
+    Scans only the announcements appended since the previous call for the same key.
+
+    :param private_key: Kyber512 secret key of the recipient
+    :param ephemeral_registry_file: Path of the binary ephemeral log
+    :param cursor_file: Path of the cursor store, defaults to `<registry>.cursors`
+    :return: List of (index, shared_key) for every new match
+    """
+    key = key_id(private_key)
+
+    with CursorStore(cursor_file or ephemeral_registry_file + ".cursors") as store, \
+            EphemeralLogReader(ephemeral_registry_file) as reader:
+        position = list(_resume_point(reader, store.load(key)))
+
+        def announcements():
+            for record in reader.records(*position):
+                position[:] = record.end, record.index + 1
+                yield Announcement(record.index, record.ciphertext, record.view_tag, record.rk)
+
+        matches = [(announcement.index, shared_key)
+                   for announcement, shared_key in match_announcements(announcements(), private_key)]
+        offset, index = position
+        store.save(key, ScanCursor(offset, index, _tail_checksum(reader, offset)))
+    return matches
+
+
+def follow_announcements(private_key, ephemeral_registry_file="ephemeral_registry.log", cursor_file=None,
+                         poll_interval=1.0, timeout=None):
+    """
+    Yields matches as they are appended to the log, blocking between appends.
+
+    :param private_key: Kyber512 secret key of the recipient
+    :param ephemeral_registry_file: Path of the binary ephemeral log
+    :param cursor_file: Path of the cursor store, defaults to `<registry>.cursors`
+    :param poll_interval: Maximum number of seconds between checks for appends by other processes
+    :param timeout: Stop after this many seconds without a new announcement, None follows forever
+    :return: Generator of (index, shared_key)
+    """
+    while True:
+        size = os.path.getsize(ephemeral_registry_file)
+        yield from scan_new_announcements(private_key, ephemeral_registry_file, cursor_file)
+
+        waited = 0.0
+        while not wait_for_growth(ephemeral_registry_file, size, poll_interval):
+            waited += poll_interval
+            if timeout is not None and waited >= timeout:
+                return
@@ -0,0 +1,310 @@
+import hashlib
+import os
+from typing import NamedTuple
+import numpy as np
+from polynomial_ring import polynomial_ring
+
+# Kyber512 parameters (round 3 specification)
+N = 256
+Q = 3329
+K = 2
+ETA_1 = 3
+ETA_2 = 2
+DU = 10
+DV = 4
+
+POLYNOMIAL_BYTES = 12 * N // 8
+SECRET_KEY_PKE_BYTES = K * POLYNOMIAL_BYTES
+PUBLIC_KEY_BYTES = SECRET_KEY_PKE_BYTES + 32
+CIPHERTEXT_BYTES = (K * DU + DV) * N // 8
+_U_BYTES = K * DU * N // 8
+
+
+# NTT form is 128 polynomials of degree one, modulo X^2 - gamma
+_RING = polynomial_ring(N, Q)
+
+
+def _compress(x, d):
+    return (((x << d) + Q // 2) // Q) % (1 << d)
+
+
+def _decompress(x, d):
+    return (Q * x + (1 << (d - 1))) >> d
+
+
+def _decode(data, d):
+    # data has shape (..., 32 * d), coefficients are little-endian d-bit integers
+    bits = np.unpackbits(data, axis=-1, bitorder="little").reshape(data.shape[:-1] + (N, d))
+    coefficients = bits.astype(np.int64) @ (1 << np.arange(d, dtype=np.int64))
+    return coefficients % Q if d == 12 else coefficients
+
+
+def _encode(coefficients, d):
+    bits = ((coefficients[..., None] >> np.arange(d)) & 1).astype(np.uint8)
+    return np.packbits(bits.reshape(coefficients.shape[:-1] + (N * d,)), axis=-1, bitorder="little")
+
+
+def _cbd(data, eta):
+    # centered binomial distribution, data has shape (..., 64 * eta)
+    bits = np.unpackbits(data, axis=-1, bitorder="little").reshape(data.shape[:-1] + (N, 2, eta))
+    counts = bits.sum(axis=-1, dtype=np.int64)
+    return (counts[..., 0] - counts[..., 1]) % Q
+
+
+def _sample_ntt(seed):
+    # Parse: rejection sampling of 12-bit values below q from a SHAKE-128 stream
+    length = 840
+    while True:
+        stream = np.frombuffer(hashlib.shake_128(seed).digest(length), dtype=np.uint8).astype(np.int64)
+        triples = stream.reshape(-1, 3)
+        d1 = triples[:, 0] + 256 * (triples[:, 1] % 16)
+        d2 = triples[:, 1] // 16 + 16 * triples[:, 2]
+        candidates = np.stack([d1, d2], axis=1).reshape(-1)
+        candidates = candidates[candidates < Q]
+        if len(candidates) >= N:
+            return candidates[:N]
+        length *= 2
+
+
+def _as_array(data):
+    return np.frombuffer(bytes(data), dtype=np.uint8)
+
+
+def _prf(seed, nonce, eta):
+    return hashlib.shake_256(seed + bytes([nonce])).digest(64 * eta)
+
+
+def _h(data):
+    return hashlib.sha3_256(data).digest()
+
+
+def _g(data):
+    digest = hashlib.sha3_512(data).digest()
+    return digest[:32], digest[32:]
+
+
+def _kdf(data):
+    return hashlib.shake_256(data).digest(32)
+
+
+class PreparedPublicKey:
+    """
+    Kyber512 public key unpacked once: t in NTT form, the expanded matrix
+    A^T in NTT form and H(pk).
+    """
+
+    def __init__(self, public_key: bytes):
+        if len(public_key) != PUBLIC_KEY_BYTES:
+            raise ValueError(f"Kyber512 public key must be {PUBLIC_KEY_BYTES} bytes.")
+        self.public_key = bytes(public_key)
+        self.rho = self.public_key[-32:]
+        self.t_hat = _decode(_as_array(self.public_key[:-32]).reshape(K, POLYNOMIAL_BYTES), 12)
+        self.a_hat_t = np.array([
+            [_sample_ntt(self.rho + bytes([i, j])) for j in range(K)]
+            for i in range(K)
+        ])
+        self.h = _h(self.public_key)
+
+
+class PreparedSecretKey:
+    """
+    Kyber512 secret key (sk' || pk || H(pk) || z) unpacked once: s in NTT form
+    and the prepared public key used for the re-encryption check.
+    """
+
+    def __init__(self, private_key: bytes):
+        private_key = bytes(private_key)
+        self.s_hat = _decode(_as_array(private_key[:SECRET_KEY_PKE_BYTES]).reshape(K, POLYNOMIAL_BYTES), 12)
+        self.public_key = PreparedPublicKey(private_key[SECRET_KEY_PKE_BYTES:-64])
+        self.h_pk = private_key[-64:-32]
+        self.z = private_key[-32:]
+
+
+def prepare_secret_key(private_key) -> PreparedSecretKey:
+    """
+    Unpacks a secret key, keys that are already prepared are returned as they are.
+
+    Scanners prepare every key once per scan instead of caching them, so
+    secret keys never outlive the scan that uses them.
+    """
+    if isinstance(private_key, PreparedSecretKey):
+        return private_key
+    return PreparedSecretKey(private_key)
+
+
+def as_ciphertext_array(ciphertexts):
+    """
+    :param ciphertexts: Iterable of Kyber512 ciphertexts
+    :return: uint8 array of shape (count, 768)
+    """
+    data = b"".join(ciphertexts)
+    return np.frombuffer(data, dtype=np.uint8).reshape(-1, CIPHERTEXT_BYTES)
+
+
+def as_message_array(messages):
+    return np.frombuffer(b"".join(messages), dtype=np.uint8).reshape(-1, 32)
+
+
+def cpa_decrypt(s_hat, ciphertexts):
+    """
+    IND-CPA decryption of a batch of ciphertexts.
+
+    :param s_hat: Secret vector in NTT form, shape (2, 256)
+    :param ciphertexts: uint8 array of shape (count, 768)
+    :return: uint8 array of shape (count, 32) with the decrypted messages
+    """
+    count = len(ciphertexts)
+    u = _decompress(_decode(ciphertexts[:, :_U_BYTES].reshape(count, K, DU * 32), DU), DU)
+    v = _decompress(_decode(ciphertexts[:, _U_BYTES:], DV), DV)
+    w = _RING.intt(_RING.ntt_multiply(s_hat, _RING.ntt(u)).sum(axis=-2) % Q)
+    return _encode(_compress((v - w) % Q, 1), 1)
+
+
+def cpa_encrypt(public_key: PreparedPublicKey, messages, coins):
+    """
+    IND-CPA encryption of a batch of messages.
+
+    :param public_key: Prepared public key
+    :param messages: uint8 array of shape (count, 32)
+    :param coins: List of 32 byte random coins, one per message
+    :return: uint8 array of shape (count, 768) with the ciphertexts
+    """
+    count = len(messages)
+    noise = np.frombuffer(b"".join(
+        b"".join(_prf(seed, nonce, ETA_1) for nonce in range(K))
+        + b"".join(_prf(seed, nonce, ETA_2) for nonce in range(K, 2 * K + 1))
+        for seed in coins
+    ), dtype=np.uint8).reshape(count, -1)
+    r_bytes = K * 64 * ETA_1
+    r = _cbd(noise[:, :r_bytes].reshape(count, K, 64 * ETA_1), ETA_1)
+    e1 = _cbd(noise[:, r_bytes:r_bytes + K * 64 * ETA_2].reshape(count, K, 64 * ETA_2), ETA_2)
+    e2 = _cbd(noise[:, r_bytes + K * 64 * ETA_2:], ETA_2)
+
+    r_hat = _RING.ntt(r)
+    u = (_RING.intt(_RING.matrix_vector(public_key.a_hat_t, r_hat)) + e1) % Q
+    v = _RING.intt(_RING.ntt_multiply(public_key.t_hat, r_hat).sum(axis=-2) % Q)
+    v = (v + e2 + _decompress(_decode(messages, 1), 1)) % Q
+
+    c1 = _encode(_compress(u, DU), DU).reshape(count, _U_BYTES)
+    c2 = _encode(_compress(v, DV), DV)
+    return np.concatenate([c1, c2], axis=1)
+
+
+def encapsulate(public_key: PreparedPublicKey, count: int = 1) -> list:
+    """
+    Kyber512 encapsulation of `count` fresh keys to the same recipient.
+
+    The public key is prepared once, so repeated encapsulations skip decoding
+    t and expanding the matrix A from the seed. The output is interchangeable
+    with `kyber.Kyber512.enc`.
+
+    :param public_key: Prepared public key of the recipient
+    :param count: Number of keys to encapsulate
+    :return: List of (ciphertext, shared_key) pairs
+    """
+    messages, k_bars, coins = [], [], []
+    for _ in range(count):
+        m = _h(os.urandom(32))
+        k_bar, r = _g(m + public_key.h)
+        messages.append(m)
+        k_bars.append(k_bar)
+        coins.append(r)
+    ciphertexts = cpa_encrypt(public_key, as_message_array(messages), coins)
+    return [
+        (ciphertext.tobytes(), _kdf(k_bar + _h(ciphertext.tobytes())))
+        for ciphertext, k_bar in zip(ciphertexts, k_bars)
+    ]
+
+
+class DecryptedBatch(NamedTuple):
+    # key each ciphertext decapsulates to if it passes the re-encryption check
+    keys: list
+    messages: np.ndarray
+    coins: list
+
+
+def decrypt_candidates(prepared: PreparedSecretKey, ciphertexts) -> DecryptedBatch:
+    """
+    First half of the decapsulation: decrypts every ciphertext and derives the
+    key it would decapsulate to, without the re-encryption check.
+
+    :param prepared: Prepared secret key
+    :param ciphertexts: uint8 array of shape (count, 768)
+    :return: DecryptedBatch
+    """
+    messages = cpa_decrypt(prepared.s_hat, ciphertexts)
+    keys, coins = [], []
+    for message, ciphertext in zip(messages, ciphertexts):
+        k_bar, r = _g(message.tobytes() + prepared.h_pk)
+        keys.append(_kdf(k_bar + _h(ciphertext.tobytes())))
+        coins.append(r)
+    return DecryptedBatch(keys, messages, coins)
+
+
+def reencryption_matches(prepared: PreparedSecretKey, ciphertexts, messages, coins):
+    """
+    Second half of the decapsulation: re-encrypts the decrypted messages and
+    compares the result with the ciphertexts.
+
+    :return: Boolean array, True where the ciphertext is valid for the key
+    """
+    if len(ciphertexts) == 0:
+        return np.zeros(0, dtype=bool)
+    return np.all(cpa_encrypt(prepared.public_key, messages, coins) == ciphertexts, axis=1)
+
+
+def decapsulate_batch(prepared: PreparedSecretKey, ciphertexts) -> list:
+    """
+    Kyber512 decapsulation of a batch of ciphertexts, byte-for-byte equal to
+    `kyber.Kyber512.dec` applied to every ciphertext.
+
+    :param prepared: Prepared secret key
+    :param ciphertexts: uint8 array of shape (count, 768)
+    :return: List of 32 byte shared keys
+    """
+    decrypted = decrypt_candidates(prepared, ciphertexts)
+    valid = reencryption_matches(prepared, ciphertexts, decrypted.messages, decrypted.coins)
+    return [
+        key if ok else _kdf(prepared.z + _h(ciphertext.tobytes()))
+        for key, ok, ciphertext in zip(decrypted.keys, valid, ciphertexts)
+    ]
+
+
+def test_batch_decapsulation(count=32):
+    """
+    Compares the batch decapsulation with kyber-py on valid and tampered ciphertexts.
+    """
+    import kyber
+
+    print("=== Batch decapsulation against kyber-py ===")
+    pk, sk = kyber.Kyber512.keygen()
+    ciphertexts = []
+    for i in range(count):
+        ciphertext, _ = kyber.Kyber512.enc(pk)
+        if i % 4 == 3:
+            ciphertext = os.urandom(CIPHERTEXT_BYTES)
+        ciphertexts.append(ciphertext)
+
+    expected = [kyber.Kyber512.dec(ciphertext, sk) for ciphertext in ciphertexts]
+    actual = decapsulate_batch(prepare_secret_key(sk), as_ciphertext_array(ciphertexts))
+    print("Validation result:", "PASS" if actual == expected else "FAIL")
+    print()
+
+
+def test_prepared_encapsulation(count=16):
+    """
+    Checks that kyber-py decapsulates keys encapsulated with a prepared public key.
+    """
+    import kyber
+
+    print("=== Prepared public key encapsulation against kyber-py ===")
+    pk, sk = kyber.Kyber512.keygen()
+    encapsulations = encapsulate(PreparedPublicKey(pk), count)
+    valid = all(kyber.Kyber512.dec(ciphertext, sk) == shared_key for ciphertext, shared_key in encapsulations)
+    print("Validation result:", "PASS" if valid else "FAIL")
+    print()
+
+
+if __name__ == "__main__":
+    test_batch_decapsulation()
+    test_prepared_encapsulation()
@@ -1,4 +1,9 @@
+import hashlib
 import numpy as np
+import os
+from concurrent.futures import ProcessPoolExecutor
+from modular_arithmetic import mod_matmul
+from polynomial_ring import polynomial_ring, schoolbook_multiply
 
 def generate_mlwe_samples(n, q, m, error_std):
     """
@@ -12,13 +17,13 @@ def generate_mlwe_samples(n, q, m, error_std):
     """
     np.random.seed(42) 
     
-    s = np.random.randint(0, q, size=n)
+    s = np.random.randint(0, q, size=n, dtype=np.int64)
     
-    A = np.random.randint(0, q, size=(m, n))
+    A = np.random.randint(0, q, size=(m, n), dtype=np.int64)
     
     e = np.round(np.random.normal(0, error_std, size=m)).astype(int) % q
     
-    b = (A @ s + e) % q
+    b = (mod_matmul(A, s, q) + e) % q
     
     return A, b, s
 
@@ -30,7 +35,7 @@ def generate_random_vectors(m, q):
     :param q: Prime modulus
     :return: Randomly generated vector b
     """
-    return np.random.randint(0, q, size=m)
+    return np.random.randint(0, q, size=m, dtype=np.int64)
 
 def validate_mlwe_samples(A, b, s, q, error_std):
     """
@@ -43,12 +48,237 @@ def validate_mlwe_samples(A, b, s, q, error_std):
     :param error_std: Standard deviation of error
     :return: Boolean indicating if validation is successful
     """
-    expected_b = (A @ s) % q
+    expected_b = mod_matmul(A, s, q)
     
     error = (b - expected_b + q // 2) % q - q // 2
     
     return np.all(np.abs(error) <= 3 * error_std)  
 
+def _instance_generator(entropy, index):
+    # SeedSequence(entropy, spawn_key=(i,)) is the i-th child of SeedSequence(entropy).spawn,
+    # so every instance has its own stream no matter how the batch is split
+    return np.random.Generator(np.random.PCG64(np.random.SeedSequence(entropy, spawn_key=(index,))))
+
+def generate_mlwe_batch(n, q, m, error_std, count, seed=None, start=0):
+    """
+    Generates a batch of independent MLWE instances.
+
+    Every instance is drawn from its own generator spawned from `seed`, the
+    products and reductions of the whole batch are computed in one call.
+
+    :param n: Dimension of the secret
+    :param q: Prime modulus
+    :param m: Number of samples per instance
+    :param error_std: Standard deviation of error distribution
+    :param count: Number of instances
+    :param seed: Seed of the batch, None draws fresh entropy
+    :param start: Index of the first instance, batches with the same seed and consecutive ranges form one batch
+    :return: (A, b, s) stacked along the first axis with shapes (count, m, n), (count, m) and (count, n)
+    """
+    entropy = np.random.SeedSequence(seed).entropy
+    A = np.empty((count, m, n), dtype=np.int64)
+    s = np.empty((count, n), dtype=np.int64)
+    e = np.empty((count, m))
+    for i in range(count):
+        rng = _instance_generator(entropy, start + i)
+        s[i] = rng.integers(0, q, size=n)
+        A[i] = rng.integers(0, q, size=(m, n))
+        e[i] = rng.normal(0, error_std, size=m)
+
+    e = np.round(e).astype(np.int64) % q
+    b = (mod_matmul(A, s[:, :, None], q)[:, :, 0] + e) % q
+    return A, b, s
+
+def _generate_mlwe_range(arguments):
+    n, q, m, error_std, entropy, start, count = arguments
+    return generate_mlwe_batch(n, q, m, error_std, count, entropy, start)
+
+def generate_mlwe_batch_parallel(n, q, m, error_std, count, seed=None, workers=None):
+    """
+    Generates a batch of MLWE instances split across worker processes.
+
+    The result is identical to `generate_mlwe_batch` with the same seed,
+    whatever the number of workers.
+
+    :param n: Dimension of the secret
+    :param q: Prime modulus
+    :param m: Number of samples per instance
+    :param error_std: Standard deviation of error distribution
+    :param count: Number of instances
+    :param seed: Seed of the batch, None draws fresh entropy
+    :param workers: Number of worker processes, defaults to the number of CPUs
+    :return: (A, b, s) stacked along the first axis
+    """
+    entropy = np.random.SeedSequence(seed).entropy
+    workers = max(1, min(workers or os.cpu_count() or 1, count))
+    bounds = np.linspace(0, count, workers + 1).astype(int)
+    ranges = [(n, q, m, error_std, entropy, start, stop - start)
+              for start, stop in zip(bounds[:-1], bounds[1:]) if stop > start]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        parts = list(executor.map(_generate_mlwe_range, ranges))
+    return tuple(np.concatenate(arrays) for arrays in zip(*parts))
+
+def validate_mlwe_batch(A, b, s, q, error_std):
+    """
+    Validates a batch of MLWE instances.
+
+    :param A: Public matrices, shape (count, m, n)
+    :param b: Noisy output vectors, shape (count, m)
+    :param s: Secret vectors, shape (count, n)
+    :param q: Prime modulus
+    :param error_std: Standard deviation of error
+    :return: Boolean array with the validation result of every instance
+    """
+    expected_b = mod_matmul(A, s[:, :, None], q)[:, :, 0]
+
+    error = (b - expected_b + q // 2) % q - q // 2
+
+    return np.all(np.abs(error) <= 3 * error_std, axis=1)
+
+SEED_BYTES = 32
+# default number of rows of a seeded matrix expanded at a time
+BLOCK_ROWS = 1024
+
+def _expand_row(seed, row, q, n):
+    # rejection sampling of n uniform values mod q from SHAKE-128(seed || row)
+    bits = (q - 1).bit_length()
+    width = -(-bits // 8)
+    # expected number of candidates with some margin, doubled if rejection leaves too few
+    candidates = int(n * (1 << bits) / q * 1.1) + 16
+    while True:
+        data = hashlib.shake_128(seed + row.to_bytes(4, "little")).digest(candidates * width)
+        padded = np.zeros((candidates, 8), dtype=np.uint8)
+        padded[:, :width] = np.frombuffer(data, dtype=np.uint8).reshape(candidates, width)
+        values = padded.view("<u8")[:, 0] & np.uint64((1 << bits) - 1)
+        values = values[values < q]
+        if len(values) >= n:
+            return values[:n].astype(np.int64)
+        candidates *= 2
+
+class SeededMatrix:
+    """
+    Public matrix represented by a 32-byte seed, as in Kyber.
+
+    Row i is expanded from SHAKE-128(seed || i) with rejection sampling, so any
+    block of rows can be produced on demand and the matrix can be shipped as
+    its seed.
+    """
+
+    def __init__(self, seed, q, m, n):
+        self.seed = bytes(seed)
+        self.q = q
+        self.shape = (m, n)
+
+    def rows(self, start, stop):
+        """
+        :return: Rows start to stop - 1 as an int64 array
+        """
+        return np.stack([_expand_row(self.seed, row, self.q, self.shape[1]) for row in range(start, stop)])
+
+    def blocks(self, block_rows=BLOCK_ROWS):
+        """
+        :return: Generator of (start, rows) for consecutive blocks of at most `block_rows` rows
+        """
+        for start in range(0, self.shape[0], block_rows):
+            yield start, self.rows(start, min(start + block_rows, self.shape[0]))
+
+    def dense(self):
+        return self.rows(0, self.shape[0])
+
+def generate_mlwe_samples_seeded(n, q, m, error_std, seed=None, block_rows=BLOCK_ROWS):
+    """
+    Generates MLWE samples with the public matrix expanded from a seed block by block,
+    at most `block_rows` rows of A are in memory at a time.
+
+    :param n: Dimension of the secret
+    :param q: Prime modulus
+    :param m: Number of samples
+    :param error_std: Standard deviation of error distribution
+    :param seed: Seed of the generator, None draws fresh entropy
+    :param block_rows: Number of rows of A expanded at a time
+    :return: (A, b, s) where A is a SeededMatrix
+    """
+    rng = np.random.default_rng(seed)
+    A = SeededMatrix(rng.bytes(SEED_BYTES), q, m, n)
+    s = rng.integers(0, q, size=n)
+
+    b = np.empty(m, dtype=np.int64)
+    for start, rows in A.blocks(block_rows):
+        e = np.round(rng.normal(0, error_std, size=len(rows))).astype(np.int64) % q
+        b[start:start + len(rows)] = (mod_matmul(rows, s, q) + e) % q
+
+    return A, b, s
+
+def validate_mlwe_samples_seeded(A, b, s, q, error_std, block_rows=BLOCK_ROWS):
+    """
+    Validates MLWE samples whose public matrix is a SeededMatrix, streaming over A in blocks.
+
+    :param A: SeededMatrix
+    :param b: Noisy output vector
+    :param s: Secret vector
+    :param q: Prime modulus
+    :param error_std: Standard deviation of error
+    :param block_rows: Number of rows of A expanded at a time
+    :return: Boolean indicating if validation is successful
+    """
+    for start, rows in A.blocks(block_rows):
+        expected_b = mod_matmul(rows, s, q)
+
+        error = (b[start:start + len(rows)] - expected_b + q // 2) % q - q // 2
+
+        if not np.all(np.abs(error) <= 3 * error_std):
+            return False
+    return True
+
+def _centered_binomial(rng, eta, size):
+    return rng.binomial(eta, 0.5, size) - rng.binomial(eta, 0.5, size)
+
+def generate_module_lwe_samples(n, q, k, eta, seed=None, count=None):
+    """
+    Generates module-LWE samples over the ring R_q = Z_q[X]/(X^n + 1).
+
+    A is a k x k matrix of ring elements, the secret and the error are vectors of
+    k ring elements with centered binomial coefficients, as in Kyber. The product
+    A s is computed in NTT form in O(k^2 n log n).
+
+    :param n: Dimension of the polynomial ring, a power of two
+    :param q: Prime modulus
+    :param k: Module rank
+    :param eta: Parameter of the centered binomial distribution of secret and error
+    :param seed: Seed of the generator, None draws fresh entropy
+    :param count: Number of instances stacked along a leading axis, None generates one
+    :return: (A, b, s) where A has shape (..., k, k, n) and b and s have shape (..., k, n)
+    """
+    rng = np.random.default_rng(seed)
+    batch = () if count is None else (count,)
+    ring = polynomial_ring(n, q)
+
+    A = rng.integers(0, q, size=batch + (k, k, n))
+    s = _centered_binomial(rng, eta, batch + (k, n)) % q
+    e = _centered_binomial(rng, eta, batch + (k, n)) % q
+
+    b = (ring.intt(ring.matrix_vector(ring.ntt(A), ring.ntt(s))) + e) % q
+
+    return A, b, s
+
+def validate_module_lwe_samples(A, b, s, q, eta):
+    """
+    Validates module-LWE samples by checking that b - A s is within the error bound.
+
+    :param A: Public matrix of ring elements, shape (..., k, k, n)
+    :param b: Noisy output vector, shape (..., k, n)
+    :param s: Secret vector, shape (..., k, n)
+    :param q: Prime modulus
+    :param eta: Parameter of the centered binomial error distribution
+    :return: Boolean indicating if validation is successful
+    """
+    ring = polynomial_ring(b.shape[-1], q)
+    expected_b = ring.intt(ring.matrix_vector(ring.ntt(A), ring.ntt(s)))
+
+    error = (b - expected_b + q // 2) % q - q // 2
+
+    return np.all(np.abs(error) <= eta)
+
 def differentiate_mlwe_random(b_mlwe, b_random):
     """
     Tests if we can differentiate between MLWE-generated vectors and purely random vectors.
@@ -68,6 +298,9 @@ def test_mlwe():
     """
     Tests the MLWE sample generation with multiple test cases and differentiation tests.
     """
+    # imported here, streaming_statistics builds on this module
+    from streaming_statistics import differentiate_from_uniform, streaming_statistics
+
     test_cases = [
         (4, 97, 6, 3),  
         (5, 101, 8, 4), 
@@ -79,15 +312,77 @@ def test_mlwe():
         A, b_mlwe, s = generate_mlwe_samples(n, q, m, e_std)
         b_random = generate_random_vectors(m, q)
         valid = validate_mlwe_samples(A, b_mlwe, s, q, e_std)
-        diff_result = differentiate_mlwe_random(b_mlwe, b_random)
+        diff_result = differentiate_from_uniform(streaming_statistics([b_mlwe], q))
         
         print("Public matrix A:", A)
         print("Noisy output vector b (MLWE):", b_mlwe)
         print("Random vector b:", b_random)
         print("Secret vector s:", s)
         print("Validation result:", "PASS" if valid else "FAIL")
-        print("Can differentiate MLWE from random:", "YES" if diff_result else "NO")
+        print("Can differentiate MLWE from uniform:", "YES" if diff_result else "NO")
         print("-" * 50)
 
+def test_mlwe_batch():
+    """
+    Tests that batches are reproducible, independent of how they are split and valid.
+    """
+    n, q, m, e_std, count = 16, 3329, 32, 2, 8
+    A, b, s = generate_mlwe_batch(n, q, m, e_std, count, seed=42)
+    print(f"Batch shapes: A={A.shape}, b={b.shape}, s={s.shape}")
+
+    again = generate_mlwe_batch(n, q, m, e_std, count, seed=42)
+    halves = [generate_mlwe_batch(n, q, m, e_std, 3, seed=42),
+              generate_mlwe_batch(n, q, m, e_std, count - 3, seed=42, start=3)]
+    split = tuple(np.concatenate(arrays) for arrays in zip(*halves))
+    parallel = generate_mlwe_batch_parallel(n, q, m, e_std, count, seed=42, workers=2)
+
+    for name, other in (("Repeated", again), ("Split", split), ("Parallel", parallel)):
+        same = all(np.array_equal(x, y) for x, y in zip((A, b, s), other))
+        print(f"{name} batch identical:", "PASS" if same else "FAIL")
+    print("Instances differ:", "PASS" if not np.array_equal(s[0], s[1]) else "FAIL")
+    # the 3 sigma bound is exceeded now and then by the rounded Gaussian error
+    print(f"Valid instances: {validate_mlwe_batch(A, b, s, q, e_std).sum()}/{count}")
+    rejected = not validate_mlwe_batch(A, b, np.roll(s, 1, axis=0), q, e_std).any()
+    print("Wrong secrets rejected:", "PASS" if rejected else "FAIL")
+    print("-" * 50)
+
+def test_module_lwe():
+    """
+    Tests module-LWE generation at Kyber512 parameters against schoolbook multiplication.
+    """
+    n, q, k, eta = 256, 3329, 2, 3
+    A, b, s = generate_module_lwe_samples(n, q, k, eta, seed=42)
+    print(f"Module-LWE shapes: A={A.shape}, b={b.shape}, s={s.shape}")
+
+    schoolbook_b = schoolbook_multiply(A, s[None, :, :], q).sum(axis=-2) % q
+    error = (b - schoolbook_b + q // 2) % q - q // 2
+    print("NTT product matches schoolbook:", "PASS" if np.all(np.abs(error) <= eta) else "FAIL")
+    print("Validation result:", "PASS" if validate_module_lwe_samples(A, b, s, q, eta) else "FAIL")
+    wrong = validate_module_lwe_samples(A, b, np.roll(s, 1, axis=0), q, eta)
+    print("Wrong secret rejected:", "PASS" if not wrong else "FAIL")
+    print("-" * 50)
+
+def test_seeded_mlwe():
+    """
+    Tests seeded public matrices against their dense expansion.
+    """
+    n, q, m, e_std = 64, 3329, 5000, 1
+    A, b, s = generate_mlwe_samples_seeded(n, q, m, e_std, seed=42, block_rows=512)
+    dense = A.dense()
+    print(f"Seeded matrix: {len(A.seed)}-byte seed for a {A.shape[0]}x{A.shape[1]} matrix "
+          f"({dense.nbytes} bytes dense)")
+    print("Values in range:", "PASS" if dense.min() >= 0 and dense.max() < q else "FAIL")
+    same = np.array_equal(SeededMatrix(A.seed, q, m, n).rows(1000, 1010), dense[1000:1010])
+    print("Blocks match the dense expansion:", "PASS" if same else "FAIL")
+    dense_valid = validate_mlwe_samples(dense, b, s, q, e_std)
+    seeded_valid = validate_mlwe_samples_seeded(A, b, s, q, e_std, block_rows=700)
+    print("Streaming and dense validation agree:", "PASS" if dense_valid == seeded_valid else "FAIL")
+    rejected = not validate_mlwe_samples_seeded(A, b, (s + 1) % q, q, e_std)
+    print("Wrong secret rejected:", "PASS" if rejected else "FAIL")
+    print("-" * 50)
+
 if __name__ == "__main__":
-    test_mlwe()
\ No newline at end of file
+    test_mlwe()
+    test_mlwe_batch()
+    test_module_lwe()
+    test_seeded_mlwe()
\ No newline at end of file
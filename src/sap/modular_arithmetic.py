@@ -0,0 +1,101 @@
+import numpy as np
+
+# float64 sums of integers are exact below 2^53
+_EXACT_BITS = 53
+# largest modulus handled, sums of two residues must fit in int64
+MAX_MODULUS_BITS = 62
+
+
+def _limb_layout(q, n):
+    # fewest limbs whose products, summed over a block of columns, stay exact in float64
+    bits = max((q - 1).bit_length(), 1)
+    block_bits = min(max(n - 1, 1).bit_length(), 20)
+    limbs = 1
+    while 2 * -(-bits // limbs) + block_bits > _EXACT_BITS:
+        limbs += 1
+    width = -(-bits // limbs)
+    return limbs, width, 1 << (_EXACT_BITS - 2 * width)
+
+
+def _shift_mod(x, bits, q):
+    # x * 2^bits mod q by doubling, x < q < 2^62 never overflows
+    for _ in range(bits):
+        x = (x << 1) % q
+    return x
+
+
+def mod_matmul(A, B, q):
+    """
+    Exact (A @ B) mod q for integer arrays, without int64 overflow.
+
+    The operands are split into limbs and the inner dimension into blocks, so that
+    every partial product is an exact float64 matrix product, and partial results
+    are reduced mod q per block. Leading axes broadcast as in `np.matmul`.
+
+    :param A: Integer array of shape (..., m, n)
+    :param B: Integer array of shape (..., n, p) or (n,)
+    :param q: Modulus, below 2^62
+    :return: int64 array with the product mod q
+    """
+    if q >= 1 << MAX_MODULUS_BITS:
+        raise ValueError(f"The modulus must be below 2^{MAX_MODULUS_BITS}.")
+    # operands are reduced first, so negative and out-of-range values are handled like (A @ B) % q
+    A = np.asarray(A, dtype=np.int64) % q
+    B = np.asarray(B, dtype=np.int64) % q
+    vector = B.ndim == 1
+    if vector:
+        B = B[:, None]
+
+    n = A.shape[-1]
+    limbs, width, block = _limb_layout(q, n)
+    mask = (1 << width) - 1
+    A_limbs = [((A >> (width * i)) & mask).astype(np.float64) for i in range(limbs)]
+    B_limbs = [((B >> (width * j)) & mask).astype(np.float64) for j in range(limbs)]
+
+    # diagonals[t] = sum of A_i @ B_j over i + j = t, mod q
+    diagonals = [None] * (2 * limbs - 1)
+    for start in range(0, n, block):
+        stop = min(start + block, n)
+        for i in range(limbs):
+            for j in range(limbs):
+                partial = np.matmul(A_limbs[i][..., start:stop], B_limbs[j][..., start:stop, :]).astype(np.int64) % q
+                t = i + j
+                diagonals[t] = partial if diagonals[t] is None else (diagonals[t] + partial) % q
+
+    # Horner evaluation of sum(diagonals[t] * 2^(width * t)) mod q
+    result = diagonals[-1]
+    for diagonal in reversed(diagonals[:-1]):
+        result = (_shift_mod(result, width, q) + diagonal) % q
+    return result[..., 0] if vector else result
+
+
+def test_mod_matmul():
+    """
+    Tests the modular products against a big-integer reference.
+    """
+    rng = np.random.default_rng(42)
+    for q, m, n in ((97, 6, 4), (3329, 64, 256), ((1 << 32) - 5, 16, 512), ((1 << 61) - 1, 8, 300)):
+        A = rng.integers(0, q, size=(m, n), dtype=np.int64)
+        s = rng.integers(0, q, size=n, dtype=np.int64)
+        expected = np.array([sum(int(a) * int(x) for a, x in zip(row, s)) % q for row in A], dtype=object)
+        product = mod_matmul(A, s, q)
+        exact = np.array_equal(product.astype(object), expected)
+        overflow = np.array_equal((A @ s) % q, expected)
+        print(f"q={q}, m={m}, n={n}, limbs={_limb_layout(q, n)[0]}:", "PASS" if exact else "FAIL",
+              "(plain int64 product", "exact)" if overflow else "overflows)")
+
+    # negative (centered) and out-of-range operands
+    A = np.array([[1, 2], [3, 4]])
+    s = np.array([-1, 200])
+    print("q=97, negative and out-of-range operands:",
+          "PASS" if np.array_equal(mod_matmul(A, s, 97), (A @ s) % 97) else "FAIL")
+    A = rng.integers(-(1 << 40), 1 << 40, size=(8, 64), dtype=np.int64)
+    s = rng.integers(-(1 << 40), 1 << 40, size=64, dtype=np.int64)
+    q = 3329
+    expected = np.array([sum(int(a) * int(x) for a, x in zip(row, s)) % q for row in A], dtype=object)
+    print(f"q={q}, operands in [-2^40, 2^40):",
+          "PASS" if np.array_equal(mod_matmul(A, s, q).astype(object), expected) else "FAIL")
+
+
+if __name__ == "__main__":
+    test_mod_matmul()
@@ -0,0 +1,154 @@
+from functools import lru_cache
+import numpy as np
+
+
+def _bit_reverse(i, bits):
+    return int(f"{i:0{bits}b}"[::-1], 2) if bits else 0
+
+
+def _root_of_unity(order, q):
+    # smallest z whose multiplicative order modulo q is exactly `order` (a power of two)
+    for z in range(2, q):
+        if pow(z, order // 2, q) == q - 1:
+            return z
+    raise ValueError(f"No root of unity of order {order} modulo {q}.")
+
+
+class PolynomialRing:
+    """
+    Arithmetic in R_q = Z_q[X]/(X^n + 1) with a vectorized number-theoretic transform.
+
+    X^n + 1 is split into 2^L factors X^d - gamma, where 2^(L+1) is the largest
+    power of two that divides q - 1 (at most 2n). For q = 3329 and n = 256 this
+    is the incomplete transform of Kyber, with d = 2. Polynomials are stored
+    along the last axis and every operation broadcasts over the leading axes.
+    """
+
+    def __init__(self, n: int, q: int):
+        if n & (n - 1):
+            raise ValueError("The ring dimension must be a power of two.")
+        self.n = n
+        self.q = q
+        layers = 0
+        while (1 << layers) < n and (q - 1) % (1 << (layers + 2)) == 0:
+            layers += 1
+        self.layers = layers
+        # degree of the factors X^d - gamma left after the transform
+        self.degree = n >> layers
+
+        zeta = _root_of_unity(2 << layers, q) if layers else 1
+        count = 1 << layers
+        self._zetas = np.array([pow(zeta, _bit_reverse(i, layers), q) for i in range(count)], dtype=np.int64)
+        self._gammas = np.array([(1 - 2 * (i % 2)) * self._zetas[count // 2 + i // 2] % q for i in range(count)],
+                                dtype=np.int64) if layers else np.array([q - 1], dtype=np.int64)
+        self._inverse_count = pow(count, -1, q)
+
+    def ntt(self, f):
+        """
+        :param f: Integer array of shape (..., n) with coefficients in [0, q)
+        :return: Array of the same shape in NTT form (bit-reversed order)
+        """
+        f = np.asarray(f, dtype=np.int64)
+        shape = f.shape
+        length = self.n // 2
+        while length >= self.degree:
+            blocks = self.n // (2 * length)
+            g = f.reshape(shape[:-1] + (blocks, 2, length))
+            t = self._zetas[blocks:2 * blocks, None] * g[..., 1, :] % self.q
+            f = np.stack([(g[..., 0, :] + t) % self.q, (g[..., 0, :] - t) % self.q], axis=-2).reshape(shape)
+            length //= 2
+        return f
+
+    def intt(self, f):
+        """
+        Inverse of `ntt`.
+        """
+        f = np.asarray(f, dtype=np.int64)
+        shape = f.shape
+        length = self.degree
+        while length <= self.n // 2:
+            blocks = self.n // (2 * length)
+            g = f.reshape(shape[:-1] + (blocks, 2, length))
+            zetas = self._zetas[2 * blocks - 1:blocks - 1:-1, None]
+            f = np.stack([(g[..., 0, :] + g[..., 1, :]) % self.q,
+                          zetas * (g[..., 1, :] - g[..., 0, :]) % self.q], axis=-2).reshape(shape)
+            length *= 2
+        return f * self._inverse_count % self.q
+
+    def ntt_multiply(self, a, b):
+        """
+        Multiplies polynomials in NTT form, one product modulo X^d - gamma per factor.
+        """
+        d, q = self.degree, self.q
+        a = np.asarray(a, dtype=np.int64)
+        b = np.asarray(b, dtype=np.int64)
+        a = a.reshape(a.shape[:-1] + (-1, d))
+        b = b.reshape(b.shape[:-1] + (-1, d))
+        shape = np.broadcast_shapes(a.shape, b.shape)
+        r = np.zeros(shape, dtype=np.int64)
+        for i in range(d):
+            for j in range(d):
+                product = a[..., i] * b[..., j] % q
+                if i + j < d:
+                    r[..., i + j] += product
+                else:
+                    # X^d = gamma in the factor
+                    r[..., i + j - d] += self._gammas * product % q
+                r[..., (i + j) % d] %= q
+        return r.reshape(shape[:-2] + (self.n,))
+
+    def multiply(self, a, b):
+        return self.intt(self.ntt_multiply(self.ntt(a), self.ntt(b)))
+
+    def matrix_vector(self, A_hat, s_hat):
+        """
+        Module product of matrices and vectors of ring elements in NTT form.
+
+        :param A_hat: Array of shape (..., k, l, n)
+        :param s_hat: Array of shape (..., l, n)
+        :return: Array of shape (..., k, n) in NTT form
+        """
+        return self.ntt_multiply(A_hat, s_hat[..., None, :, :]).sum(axis=-2) % self.q
+
+
+@lru_cache(maxsize=16)
+def polynomial_ring(n: int, q: int) -> PolynomialRing:
+    return PolynomialRing(n, q)
+
+
+def schoolbook_multiply(a, b, q):
+    """
+    Negacyclic product of polynomials by schoolbook multiplication, O(n^2).
+
+    :param a: Integer array of shape (..., n)
+    :param b: Integer array of shape (..., n)
+    :param q: Modulus
+    :return: Array of shape (..., n)
+    """
+    a = np.asarray(a, dtype=np.int64)
+    b = np.asarray(b, dtype=np.int64)
+    n = a.shape[-1]
+    c = np.zeros(np.broadcast_shapes(a.shape[:-1], b.shape[:-1]) + (2 * n,), dtype=np.int64)
+    for i in range(n):
+        c[..., i:i + n] = (c[..., i:i + n] + a[..., i, None] * b) % q
+    # X^n = -1
+    return (c[..., :n] - c[..., n:]) % q
+
+
+def test_polynomial_ring():
+    """
+    Tests the NTT products against schoolbook multiplication.
+    """
+    rng = np.random.default_rng(42)
+    for n, q in ((256, 3329), (256, 7681), (64, 257), (16, 97), (8, 11)):
+        ring = polynomial_ring(n, q)
+        a = rng.integers(0, q, size=(3, n))
+        b = rng.integers(0, q, size=(3, n))
+        inverse = np.array_equal(ring.intt(ring.ntt(a)), a)
+        product = np.array_equal(ring.multiply(a, b), schoolbook_multiply(a, b, q))
+        print(f"n={n}, q={q}, factor degree={ring.degree}:",
+              "PASS" if inverse and product else "FAIL")
+
+
+if __name__ == "__main__":
+    test_polynomial_ring()
@@ -3,6 +3,20 @@ from crypto.Hash import SHA3_256
 from crypto.Random import get_random_bytes
 import kyber
 import os
+from typing import NamedTuple
+from ephemeral_log import EphemeralLogReader, EphemeralLogWriter, shared_writer
+from recipient_registry import RecipientRegistry, shared_registry
+from public_key_cache import prepared_public_key_cache, public_key_cache
+from stealth_scan import BLOCK_SIZE, Announcement, compute_view_tag, match_announcements, match_many, parallel_scan
+from kyber_numpy import PUBLIC_KEY_BYTES, SECRET_KEY_PKE_BYTES, PreparedPublicKey
+from registry_service import is_service_url, shared_client
+from epoch_registry import is_epoch_registry, shared_epoch_registry
+
+class StealthMatch(NamedTuple):
+    index: int
+    ciphertext: bytes
+    shared_key: bytes
+    stealth_address: bytes
 
 def generate_stealth_address(rk, key, pk):
     hash_input = rk + key + pk
@@ -10,7 +24,53 @@ def generate_stealth_address(rk, key, pk):
     stealth_address = hash_obj.digest()
     return stealth_address
 
-def register_recipient(recipient_id, public_key, registry_file="registry.csv"):
+def _is_csv(registry_file):
+    return str(registry_file).lower().endswith(".csv")
+
+def _recipient_registry(registry_file):
+    # local SQLite registry or a client of a running registry service
+    return shared_client(registry_file) if is_service_url(registry_file) else shared_registry(registry_file)
+
+def _migrate_legacy_csv(registry_file, migrate):
+    # registries written before the SQLite and binary log formats are CSV files with the same name,
+    # they are migrated the first time the new file is needed, into a temporary file that is then
+    # linked into place so a concurrent migration in another process never leaves a partial registry
+    csv_file = os.path.splitext(registry_file)[0] + ".csv"
+    if os.path.exists(registry_file) or not os.path.exists(csv_file):
+        return
+    temporary = f"{registry_file}.{os.getpid()}.tmp"
+    migrate(csv_file, temporary)
+    try:
+        os.link(temporary, registry_file)
+    except FileExistsError:
+        pass
+    finally:
+        os.remove(temporary)
+    print(f"Migrated {csv_file} to {registry_file}.")
+
+def _migrate_legacy_recipients(registry_file):
+    if not _is_csv(registry_file) and not is_service_url(registry_file):
+        _migrate_legacy_csv(registry_file, _migrate_recipients_to_file)
+
+def _migrate_legacy_ephemeral(ephemeral_registry_file):
+    if not (_is_csv(ephemeral_registry_file) or is_service_url(ephemeral_registry_file)
+            or is_epoch_registry(ephemeral_registry_file)):
+        _migrate_legacy_csv(ephemeral_registry_file, migrate_ephemeral_registry)
+
+def register_recipient(recipient_id, public_key, registry_file="registry.db"):
+    public_key_cache.invalidate(registry_file)
+    prepared_public_key_cache.invalidate(registry_file)
+    if _is_csv(registry_file):
+        _register_recipient_csv(recipient_id, public_key, registry_file)
+        return
+    _migrate_legacy_recipients(registry_file)
+
+    if _recipient_registry(registry_file).register(recipient_id, public_key):
+        print(f"Recipient {recipient_id} registered successfully.")
+    else:
+        print(f"Recipient {recipient_id} already registered.")
+
+def _register_recipient_csv(recipient_id, public_key, registry_file):
     if not os.path.exists(registry_file):
         registry = pd.DataFrame(columns=["Recipient ID", "Public Key"])
         registry.to_csv(registry_file, index=False)
@@ -24,43 +84,177 @@ def register_recipient(recipient_id, public_key, registry_file="registry.csv"):
         registry.to_csv(registry_file, index=False)
         print(f"Recipient {recipient_id} registered successfully.")
 
-def retrieve_public_key(recipient_id, registry_file="registry.csv"):
-    if not os.path.exists(registry_file):
+def _check_registry(registry_file):
+    _migrate_legacy_recipients(registry_file)
+    # a registry service has no local file to check
+    if not is_service_url(registry_file) and not os.path.exists(registry_file):
         raise FileNotFoundError(f"Registry file {registry_file} not found.")
-    
+
+def retrieve_public_key(recipient_id, registry_file="registry.db"):
+    _check_registry(registry_file)
+    return public_key_cache.get(registry_file, recipient_id, _load_public_key)
+
+def retrieve_prepared_public_key(recipient_id, registry_file="registry.db"):
+    _check_registry(registry_file)
+    return prepared_public_key_cache.get(registry_file, recipient_id, _load_prepared_public_key)
+
+def _load_prepared_public_key(recipient_id, registry_file):
+    return PreparedPublicKey(retrieve_public_key(recipient_id, registry_file))
+
+def _load_public_key(recipient_id, registry_file):
+    if _is_csv(registry_file):
+        return _retrieve_public_key_csv(recipient_id, registry_file)
+
+    public_key = _recipient_registry(registry_file).lookup(recipient_id)
+    if public_key is None:
+        raise ValueError(f"Recipient {recipient_id} not found in registry.")
+    return public_key
+
+def _retrieve_public_key_csv(recipient_id, registry_file):
     registry = pd.read_csv(registry_file)
     recipient = registry[registry["Recipient ID"] == recipient_id]
     if recipient.empty:
         raise ValueError(f"Recipient {recipient_id} not found in registry.")
     return bytes.fromhex(recipient["Public Key"].values[0])
 
-def register_ephemeral_key(ciphertext, view_tag, ephemeral_registry_file="ephemeral_registry.csv"):
-    if not os.path.exists(ephemeral_registry_file):
-        ephemeral_registry = pd.DataFrame(columns=["Ciphertext", "View Tag"])
-        ephemeral_registry.to_csv(ephemeral_registry_file, index=False)
+def retrieve_public_keys(recipient_ids, registry_file="registry.db"):
+    _check_registry(registry_file)
+
+    if is_service_url(registry_file):
+        found = shared_client(registry_file).lookup_many(recipient_ids)
+    elif _is_csv(registry_file):
+        registry = pd.read_csv(registry_file)
+        found = {str(recipient_id): bytes.fromhex(public_key)
+                 for recipient_id, public_key in zip(registry["Recipient ID"], registry["Public Key"])}
     else:
-        ephemeral_registry = pd.read_csv(ephemeral_registry_file)
-    
-    ephemeral_registry = ephemeral_registry._append({"Ciphertext": ciphertext.hex(), "View Tag": view_tag.hex()}, ignore_index=True)
-    ephemeral_registry.to_csv(ephemeral_registry_file, index=False)
+        found = shared_registry(registry_file).lookup_many(recipient_ids)
+
+    public_keys = {}
+    for recipient_id in recipient_ids:
+        if str(recipient_id) not in found:
+            raise ValueError(f"Recipient {recipient_id} not found in registry.")
+        public_keys[recipient_id] = found[str(recipient_id)]
+    return public_keys
+
+def migrate_recipient_registry(csv_file="registry.csv", registry_file="registry.db"):
+    _migrate_recipients(csv_file, shared_registry(registry_file))
+
+def _migrate_recipients_to_file(csv_file, registry_file):
+    with RecipientRegistry(registry_file) as registry:
+        _migrate_recipients(csv_file, registry)
+
+def _migrate_recipients(csv_file, registry):
+    rows = pd.read_csv(csv_file)
+    registry.register_many(
+        (recipient_id, bytes.fromhex(public_key))
+        for recipient_id, public_key in zip(rows["Recipient ID"], rows["Public Key"])
+    )
+
+def register_ephemeral_key(ciphertext, view_tag, ephemeral_registry_file="ephemeral_registry.log", rk=None):
+    _migrate_legacy_ephemeral(ephemeral_registry_file)
+    if _is_csv(ephemeral_registry_file):
+        # legacy text registry, the row is appended instead of rewriting the whole file
+        # it has no column for rk so the recipient cannot derive the stealth address on its own
+        row = pd.DataFrame([{"Ciphertext": ciphertext.hex(), "View Tag": view_tag.hex()}])
+        row.to_csv(ephemeral_registry_file, mode="a", header=not os.path.exists(ephemeral_registry_file), index=False)
+    elif is_service_url(ephemeral_registry_file):
+        shared_client(ephemeral_registry_file).append_many([(ciphertext, view_tag) if rk is None else (ciphertext, view_tag, rk)])
+    elif is_epoch_registry(ephemeral_registry_file):
+        shared_epoch_registry(ephemeral_registry_file).append_many([(ciphertext, view_tag) if rk is None else (ciphertext, view_tag, rk)])
+    elif rk is None:
+        shared_writer(ephemeral_registry_file).append(ciphertext, view_tag)
+    else:
+        shared_writer(ephemeral_registry_file).append(ciphertext, view_tag, rk)
     print("Ephemeral key registered successfully.")
 
-def scan_for_stealth_address(private_key, ephemeral_registry_file="ephemeral_registry.csv"):
+def register_ephemeral_keys(announcements, ephemeral_registry_file="ephemeral_registry.log"):
+    announcements = list(announcements)
+    _migrate_legacy_ephemeral(ephemeral_registry_file)
+    if _is_csv(ephemeral_registry_file):
+        rows = pd.DataFrame([{"Ciphertext": fields[0].hex(), "View Tag": fields[1].hex()} for fields in announcements])
+        rows.to_csv(ephemeral_registry_file, mode="a", header=not os.path.exists(ephemeral_registry_file), index=False)
+    elif is_service_url(ephemeral_registry_file):
+        # the service commits the whole group with one write and one fsync
+        shared_client(ephemeral_registry_file).append_many(announcements)
+    elif is_epoch_registry(ephemeral_registry_file):
+        # the group goes to the segment of the current epoch
+        shared_epoch_registry(ephemeral_registry_file).append_many(announcements)
+    else:
+        # one write and one fsync for the whole group
+        writer = shared_writer(ephemeral_registry_file)
+        writer.append_many(announcements)
+        writer.flush()
+    print(f"{len(announcements)} ephemeral keys registered successfully.")
+
+def iter_ephemeral_keys(ephemeral_registry_file="ephemeral_registry.log", chunk_size=BLOCK_SIZE,
+                        start_epoch=None, end_epoch=None):
+    if (start_epoch is not None or end_epoch is not None) and not is_epoch_registry(ephemeral_registry_file):
+        raise ValueError("Epoch ranges are only supported by epoch-partitioned registries.")
+    if is_service_url(ephemeral_registry_file):
+        # announcements are fetched in ranges of chunk_size over a pooled connection
+        yield from shared_client(ephemeral_registry_file).announcements(chunk_size=chunk_size)
+        return
+    _migrate_legacy_ephemeral(ephemeral_registry_file)
     if not os.path.exists(ephemeral_registry_file):
         raise FileNotFoundError(f"Ephemeral registry file {ephemeral_registry_file} not found.")
-    
-    ephemeral_registry = pd.read_csv(ephemeral_registry_file)
-    for index, row in ephemeral_registry.iterrows():
-        ciphertext = bytes.fromhex(row["Ciphertext"])
-        view_tag = bytes.fromhex(row["View Tag"])
-        
-        shared_key = kyber.Kyber512.dec(ciphertext, private_key)
-        if shared_key == view_tag:
-            print(f"Stealth address found at index {index}.")
-            return shared_key
+
+    if _is_csv(ephemeral_registry_file):
+        # read in fixed-size chunks so the registry is never fully loaded
+        index = 0
+        for chunk in pd.read_csv(ephemeral_registry_file, chunksize=chunk_size, dtype=str):
+            for ciphertext, view_tag in zip(chunk["Ciphertext"], chunk["View Tag"]):
+                yield Announcement(index, bytes.fromhex(ciphertext), bytes.fromhex(view_tag))
+                index += 1
+    elif is_epoch_registry(ephemeral_registry_file):
+        # only the segments overlapping the epoch range are read
+        yield from shared_epoch_registry(ephemeral_registry_file).announcements(start_epoch, end_epoch)
+    else:
+        with EphemeralLogReader(ephemeral_registry_file) as reader:
+            for record in reader:
+                yield Announcement(record.index, record.ciphertext, record.view_tag, record.rk)
+
+def migrate_ephemeral_registry(csv_file="ephemeral_registry.csv", log_file="ephemeral_registry.log"):
+    with EphemeralLogWriter(log_file) as writer:
+        writer.append_many((announcement.ciphertext, announcement.view_tag) for announcement in iter_ephemeral_keys(csv_file))
+
+def scan_for_stealth_address(private_key, ephemeral_registry_file="ephemeral_registry.log", workers=1,
+                             start_epoch=None, end_epoch=None):
+    _migrate_legacy_ephemeral(ephemeral_registry_file)
+    if workers != 1 and is_epoch_registry(ephemeral_registry_file):
+        if not os.path.exists(ephemeral_registry_file):
+            raise FileNotFoundError(f"Ephemeral registry file {ephemeral_registry_file} not found.")
+        # segments are scanned one after another, each with the whole pool
+        segments = shared_epoch_registry(ephemeral_registry_file).select(start_epoch, end_epoch)
+        matches = ((first_index + index, shared_key)
+                   for first_index, segment in segments
+                   for index, shared_key in parallel_scan(private_key, segment.path, workers=workers, first_only=True))
+    elif workers != 1 and not _is_csv(ephemeral_registry_file) and not is_service_url(ephemeral_registry_file):
+        matches = parallel_scan(private_key, ephemeral_registry_file, workers=workers, first_only=True)
+    else:
+        announcements = iter_ephemeral_keys(ephemeral_registry_file, start_epoch=start_epoch, end_epoch=end_epoch)
+        matches = ((announcement.index, shared_key)
+                   for announcement, shared_key in match_announcements(announcements, private_key))
+
+    for index, shared_key in matches:
+        print(f"Stealth address found at index {index}.")
+        return shared_key
     print("No matching stealth address found.")
     return None
 
+def iter_stealth_addresses(private_key, ephemeral_registry_file="ephemeral_registry.log", chunk_size=BLOCK_SIZE):
+    # Kyber512 secret key is sk' || pk || H(pk) || z
+    public_key = private_key[SECRET_KEY_PKE_BYTES:SECRET_KEY_PKE_BYTES + PUBLIC_KEY_BYTES]
+    announcements = iter_ephemeral_keys(ephemeral_registry_file, chunk_size)
+    for announcement, shared_key in match_announcements(announcements, private_key, chunk_size):
+        # without rk the stealth address can only be derived by the sender
+        stealth_address = generate_stealth_address(announcement.rk, shared_key, public_key) if announcement.rk else None
+        yield StealthMatch(announcement.index, announcement.ciphertext, shared_key, stealth_address)
+
+def scan_for_many_stealth_addresses(private_keys, ephemeral_registry_file="ephemeral_registry.log"):
+    matches = match_many(iter_ephemeral_keys(ephemeral_registry_file), private_keys)
+    print(f"Found {sum(len(found) for found in matches.values())} stealth addresses for {len(private_keys)} keys.")
+    return matches
+
 def test_case_1():
     print("=== Test Case 1: Basic Functionality ===")
     pk, sk = kyber.Kyber512.keygen()
@@ -81,7 +275,7 @@ def test_case_1():
     stealth_address = generate_stealth_address(rk, shared_key, pk_retrieved)
     print(f"Stealth Address (first 16 bytes): {stealth_address[:16].hex()}...")
     
-    register_ephemeral_key(ciphertext, shared_key)
+    register_ephemeral_key(ciphertext, compute_view_tag(shared_key), rk=rk)
     
     retrieved_shared_key = scan_for_stealth_address(sk)
     if retrieved_shared_key:
@@ -109,8 +303,8 @@ def test_case_2():
     ciphertext_alice, shared_key_alice = kyber.Kyber512.enc(pk_alice)
     ciphertext_bob, shared_key_bob = kyber.Kyber512.enc(pk_bob)
     
-    register_ephemeral_key(ciphertext_alice, shared_key_alice)
-    register_ephemeral_key(ciphertext_bob, shared_key_bob)
+    register_ephemeral_key(ciphertext_alice, compute_view_tag(shared_key_alice))
+    register_ephemeral_key(ciphertext_bob, compute_view_tag(shared_key_bob))
     
     print("Scanning for Alice's stealth address:")
     retrieved_shared_key_alice = scan_for_stealth_address(sk_alice)
@@ -144,7 +338,7 @@ def test_case_3():
     print(f"Ciphertext (first 16 bytes): {ciphertext[:16].hex()}...")
     
     invalid_ciphertext = get_random_bytes(768)
-    register_ephemeral_key(invalid_ciphertext, shared_key)
+    register_ephemeral_key(invalid_ciphertext, compute_view_tag(shared_key))
     
     retrieved_shared_key = scan_for_stealth_address(sk)
     if retrieved_shared_key:
@@ -154,10 +348,12 @@ def test_case_3():
     print()
 
 if __name__ == "__main__":
-    if os.path.exists("registry.csv"):
-        os.remove("registry.csv")
-    if os.path.exists("ephemeral_registry.csv"):
-        os.remove("ephemeral_registry.csv")
+    # legacy CSV registries are removed too, otherwise they would be migrated into the new files
+    # and so are the write-ahead log files, SQLite would replay a stale one into the new database
+    for path in ("registry.db", "registry.db-wal", "registry.db-shm", "registry.csv",
+                 "ephemeral_registry.log", "ephemeral_registry.csv"):
+        if os.path.exists(path):
+            os.remove(path)
     
     test_case_1()
     test_case_2()
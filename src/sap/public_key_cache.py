@@ -0,0 +1,98 @@
+import os
+import threading
+from collections import OrderedDict
+
+
+def _file_signature(path):
+    # SQLite in WAL mode writes to the -wal file first, the main file
+    # only changes on checkpoints, so both are part of the signature
+    signature = []
+    for name in (path, path + "-wal"):
+        try:
+            stat = os.stat(name)
+            signature.append((stat.st_mtime_ns, stat.st_size))
+        except FileNotFoundError:
+            signature.append(None)
+    return tuple(signature)
+
+
+def _cache_path(registry_file):
+    # registry service URLs are used as they are, they have no file to stat
+    # and keys are never replaced once registered
+    return registry_file if "://" in str(registry_file) else os.path.abspath(registry_file)
+
+
+class PublicKeyCache:
+    """
+    Bounded LRU cache of recipient public keys.
+
+    Entries of a registry file are dropped when the file's modification time or
+    size changes, or when `invalidate` is called for it.
+    """
+
+    def __init__(self, maxsize: int = 1024):
+        self._maxsize = maxsize
+        self._entries = OrderedDict()
+        self._signatures = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, registry_file: str, recipient_id, loader):
+        """
+        Returns the cached public key or loads it with `loader(recipient_id, registry_file)`.
+
+        :param registry_file: Path of the recipient registry
+        :param recipient_id: Recipient ID
+        :param loader: Function that reads the public key from the registry
+        :return: Public key of the recipient
+        """
+        path = _cache_path(registry_file)
+        signature = _file_signature(path)
+        key = (path, recipient_id)
+        with self._lock:
+            if self._signatures.get(path) != signature:
+                self._drop(path)
+                self._signatures[path] = signature
+            public_key = self._entries.get(key)
+            if public_key is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return public_key
+            self.misses += 1
+
+        public_key = loader(recipient_id, registry_file)
+        with self._lock:
+            # the registry may have changed while the key was being loaded
+            if self._signatures.get(path) == signature:
+                self._entries[key] = public_key
+                while len(self._entries) > self._maxsize:
+                    self._entries.popitem(last=False)
+        return public_key
+
+    def invalidate(self, registry_file: str = None):
+        with self._lock:
+            if registry_file is None:
+                self._entries.clear()
+                self._signatures.clear()
+            else:
+                path = _cache_path(registry_file)
+                self._drop(path)
+                self._signatures.pop(path, None)
+
+    def _drop(self, path):
+        for key in [key for key in self._entries if key[0] == path]:
+            del self._entries[key]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "size": len(self._entries), "maxsize": self._maxsize}
+
+    @property
+    def maxsize(self) -> int:
+        return self._maxsize
+
+
+# caches used by retrieve_public_key and retrieve_prepared_public_key
+public_key_cache = PublicKeyCache()
+prepared_public_key_cache = PublicKeyCache(maxsize=256)
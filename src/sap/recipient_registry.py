@@ -0,0 +1,125 @@
+import atexit
+import os
+import sqlite3
+
+
+class RecipientRegistry:
+    """
+    Recipient directory stored in SQLite.
+
+    Recipient IDs are the primary key of a WITHOUT ROWID table, so the B-tree
+    index is the table itself and both lookups and duplicate checks are O(log n)
+    without loading the directory into memory.
+    """
+
+    def __init__(self, path: str):
+        self._path = path
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS recipients ("
+            "recipient_id TEXT PRIMARY KEY, "
+            "public_key BLOB NOT NULL"
+            ") WITHOUT ROWID"
+        )
+        self._connection.commit()
+
+    def register(self, recipient_id, public_key: bytes) -> bool:
+        """
+        Registers a recipient unless the ID is already taken.
+
+        :param recipient_id: Recipient ID
+        :param public_key: Kyber public key of the recipient
+        :return: True if the recipient was added, False if it was already registered
+        """
+        with self._connection:
+            cursor = self._connection.execute(
+                "INSERT OR IGNORE INTO recipients (recipient_id, public_key) VALUES (?, ?)",
+                (str(recipient_id), bytes(public_key)),
+            )
+        return cursor.rowcount == 1
+
+    def register_many(self, recipients) -> int:
+        """
+        Registers several recipients in one transaction.
+
+        :param recipients: Iterable of (recipient_id, public_key) pairs
+        :return: Number of recipients that were added
+        """
+        with self._connection:
+            before = self._connection.total_changes
+            self._connection.executemany(
+                "INSERT OR IGNORE INTO recipients (recipient_id, public_key) VALUES (?, ?)",
+                ((str(recipient_id), bytes(public_key)) for recipient_id, public_key in recipients),
+            )
+            return self._connection.total_changes - before
+
+    def lookup(self, recipient_id):
+        """
+        :param recipient_id: Recipient ID
+        :return: Public key of the recipient or None if it is not registered
+        """
+        row = self._connection.execute(
+            "SELECT public_key FROM recipients WHERE recipient_id = ?", (str(recipient_id),)
+        ).fetchone()
+        return None if row is None else bytes(row[0])
+
+    def lookup_many(self, recipient_ids) -> dict:
+        """
+        :param recipient_ids: Iterable of recipient IDs
+        :return: Dictionary mapping every registered ID to its public key, unknown IDs are left out
+        """
+        recipient_ids = list(dict.fromkeys(str(recipient_id) for recipient_id in recipient_ids))
+        public_keys = {}
+        # stay below the SQLite limit on host parameters per statement
+        for start in range(0, len(recipient_ids), 500):
+            batch = recipient_ids[start:start + 500]
+            rows = self._connection.execute(
+                f"SELECT recipient_id, public_key FROM recipients WHERE recipient_id IN ({','.join('?' * len(batch))})",
+                batch,
+            )
+            public_keys.update((recipient_id, bytes(public_key)) for recipient_id, public_key in rows)
+        return public_keys
+
+    def __contains__(self, recipient_id) -> bool:
+        return self._connection.execute(
+            "SELECT 1 FROM recipients WHERE recipient_id = ?", (str(recipient_id),)
+        ).fetchone() is not None
+
+    def __len__(self) -> int:
+        return self._connection.execute("SELECT COUNT(*) FROM recipients").fetchone()[0]
+
+    def close(self):
+        self._connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @property
+    def path(self) -> str:
+        return self._path
+
+
+# registries shared by every caller in this process, one per database file
+_shared_registries = {}
+
+
+def shared_registry(path: str) -> RecipientRegistry:
+    key = os.path.abspath(path)
+    registry = _shared_registries.get(key)
+    if registry is None:
+        registry = RecipientRegistry(path)
+        _shared_registries[key] = registry
+    return registry
+
+
+def close_shared_registries():
+    for registry in _shared_registries.values():
+        registry.close()
+    _shared_registries.clear()
+
+
+atexit.register(close_shared_registries)
@@ -0,0 +1,286 @@
+import argparse
+import asyncio
+import json
+import os
+import queue
+import socket
+import struct
+import threading
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+from ephemeral_log import EphemeralLogReader, EphemeralLogWriter
+from recipient_registry import RecipientRegistry
+from stealth_scan import Announcement
+
+SCHEME = "pqsap"
+DEFAULT_PORT = 8765
+# upper bound on the number of announcements returned by one range read
+MAX_RANGE = 4096
+# upper bound on the body of a request or response, larger frames are rejected
+MAX_FRAME_SIZE = 64 * 2**20
+# the client splits batches so that the items of one request stay below this size
+_BATCH_SIZE = MAX_FRAME_SIZE - 2**16
+
+_FRAME_LENGTH = struct.Struct(">I")
+
+
+def _encode_frame(message: dict) -> bytes:
+    body = json.dumps(message).encode()
+    return _FRAME_LENGTH.pack(len(body)) + body
+
+
+class RegistryServer:
+    """
+    Local registry service, the single owner of the recipient registry and the
+    ephemeral log.
+
+    Requests are handled one at a time on a single worker thread, so every
+    append from every connected process goes through one writer and the files
+    are never rewritten concurrently, while the event loop keeps accepting
+    connections and reading frames during SQLite commits and fsyncs.
+    """
+
+    def __init__(self, registry_file="registry.db", ephemeral_registry_file="ephemeral_registry.log"):
+        self._registry = RecipientRegistry(registry_file)
+        self._ephemeral_registry_file = ephemeral_registry_file
+        self._writer = EphemeralLogWriter(ephemeral_registry_file)
+        # byte offset of every announcement, so range reads can seek by index
+        self._offsets = array("q")
+        self._end = None
+        self._reader = None
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        with EphemeralLogReader(ephemeral_registry_file) as reader:
+            for record in reader:
+                self._offsets.append(record.offset)
+                self._end = record.end
+
+    def lookup(self, recipient_ids):
+        return {recipient_id: public_key.hex()
+                for recipient_id, public_key in self._registry.lookup_many(recipient_ids).items()}
+
+    def register(self, recipients):
+        return self._registry.register_many((recipient_id, bytes.fromhex(public_key))
+                                            for recipient_id, public_key in recipients)
+
+    def append(self, announcements):
+        first = len(self._offsets)
+        offsets = self._writer.append_many(tuple(bytes.fromhex(field) for field in fields)
+                                           for fields in announcements)
+        # one fsync per request, every announcement of a batch is committed together
+        self._writer.flush()
+        self._offsets.extend(offsets)
+        self._end = os.path.getsize(self._ephemeral_registry_file)
+        return first
+
+    def read_range(self, start, count):
+        count = min(count, MAX_RANGE, len(self._offsets) - start)
+        if start < 0 or count <= 0:
+            return []
+        if self._reader is None or self._reader.size < self._end:
+            # remap the log once it has grown past the current mapping
+            if self._reader is not None:
+                self._reader.close()
+            self._reader = EphemeralLogReader(self._ephemeral_registry_file)
+        return [
+            [record.index, record.ciphertext.hex(), record.view_tag.hex(), record.rk.hex()]
+            for record in self._reader.records(self._offsets[start], start, count)
+        ]
+
+    def count(self):
+        return len(self._offsets)
+
+    def _dispatch(self, request):
+        operation = request.pop("op", None)
+        if operation not in ("lookup", "register", "append", "read_range", "count"):
+            raise ValueError(f"Unknown operation {operation}.")
+        return getattr(self, operation)(**request)
+
+    async def _handle(self, reader, writer):
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                (length,) = _FRAME_LENGTH.unpack(await reader.readexactly(_FRAME_LENGTH.size))
+                if length > MAX_FRAME_SIZE:
+                    # the body is never read, so the connection cannot be reused
+                    writer.write(_encode_frame({"ok": False, "error": f"Frame of {length} bytes is too large."}))
+                    await writer.drain()
+                    return
+                body = await reader.readexactly(length)
+                try:
+                    request = json.loads(body)
+                    if not isinstance(request, dict):
+                        raise ValueError("Requests must be JSON objects.")
+                    response = {"ok": True, "result": await loop.run_in_executor(self._executor, self._dispatch, request)}
+                except Exception as e:
+                    response = {"ok": False, "error": str(e)}
+                writer.write(_encode_frame(response))
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host="127.0.0.1", port=DEFAULT_PORT):
+        server = await asyncio.start_server(self._handle, host, port)
+        async with server:
+            await server.serve_forever()
+
+    def close(self):
+        self._executor.shutdown()
+        self._writer.close()
+        self._registry.close()
+        if self._reader is not None:
+            self._reader.close()
+
+
+class RegistryClient:
+    """
+    Blocking client of the registry service with a pool of persistent connections.
+
+    Connections are opened lazily up to `pool_size` and reused, so many threads
+    can share one client without paying a connection per request.
+    """
+
+    def __init__(self, host="127.0.0.1", port=DEFAULT_PORT, pool_size=4, timeout=30.0):
+        self._address = (host, port)
+        self._timeout = timeout
+        self._connections = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(pool_size)
+
+    def _receive(self, connection, size):
+        data = bytearray()
+        while len(data) < size:
+            chunk = connection.recv(size - len(data))
+            if not chunk:
+                raise ConnectionError("Registry service closed the connection.")
+            data += chunk
+        return bytes(data)
+
+    def _call(self, operation, **arguments):
+        frame = _encode_frame({"op": operation, **arguments})
+        if len(frame) - _FRAME_LENGTH.size > MAX_FRAME_SIZE:
+            raise ValueError("Request is too large, split it into smaller batches.")
+        with self._slots:
+            try:
+                connection = self._connections.get_nowait()
+            except queue.Empty:
+                connection = socket.create_connection(self._address, self._timeout)
+            try:
+                connection.sendall(frame)
+                (length,) = _FRAME_LENGTH.unpack(self._receive(connection, _FRAME_LENGTH.size))
+                response = json.loads(self._receive(connection, length))
+            except BaseException:
+                # the connection may hold half a frame, it cannot be reused
+                connection.close()
+                raise
+            self._connections.put(connection)
+        if not response["ok"]:
+            raise ValueError(response["error"])
+        return response["result"]
+
+    def _batches(self, items):
+        # splits the items of a bulk request into requests that fit in one frame
+        batch, size = [], 0
+        for item in items:
+            item_size = len(json.dumps(item)) + 2
+            if batch and size + item_size > _BATCH_SIZE:
+                yield batch
+                batch, size = [], 0
+            batch.append(item)
+            size += item_size
+        if batch:
+            yield batch
+
+    def lookup_many(self, recipient_ids) -> dict:
+        public_keys = {}
+        for batch in self._batches(str(recipient_id) for recipient_id in recipient_ids):
+            public_keys.update(self._call("lookup", recipient_ids=batch))
+        return {recipient_id: bytes.fromhex(public_key) for recipient_id, public_key in public_keys.items()}
+
+    def lookup(self, recipient_id):
+        return self.lookup_many([recipient_id]).get(str(recipient_id))
+
+    def register_many(self, recipients) -> int:
+        return sum(self._call("register", recipients=batch)
+                   for batch in self._batches([str(recipient_id), bytes(public_key).hex()]
+                                              for recipient_id, public_key in recipients))
+
+    def register(self, recipient_id, public_key) -> bool:
+        return self.register_many([(recipient_id, public_key)]) == 1
+
+    def append_many(self, announcements) -> list:
+        """
+        Appends announcements, batches larger than one frame are committed in several requests
+        whose indices need not be contiguous when other clients append at the same time.
+
+        :param announcements: Iterable of field tuples (ciphertext, view_tag[, rk])
+        :return: Indices of the appended announcements, in order
+        """
+        indices = []
+        for batch in self._batches([bytes(field).hex() for field in fields] for fields in announcements):
+            first = self._call("append", announcements=batch)
+            indices.extend(range(first, first + len(batch)))
+        return indices
+
+    def read_range(self, start, count) -> list:
+        return [
+            Announcement(index, bytes.fromhex(ciphertext), bytes.fromhex(view_tag), bytes.fromhex(rk))
+            for index, ciphertext, view_tag, rk in self._call("read_range", start=start, count=count)
+        ]
+
+    def count(self) -> int:
+        return self._call("count")
+
+    def announcements(self, start=0, chunk_size=MAX_RANGE):
+        """
+        :return: Generator of Announcement, fetched in ranges of `chunk_size`
+        """
+        while True:
+            chunk = self.read_range(start, chunk_size)
+            if not chunk:
+                return
+            yield from chunk
+            start = chunk[-1].index + 1
+
+    def close(self):
+        while True:
+            try:
+                self._connections.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+def is_service_url(path) -> bool:
+    return str(path).startswith(SCHEME + "://")
+
+
+# clients shared by every caller in this process, one per service URL
+_shared_clients = {}
+
+
+def shared_client(url: str) -> RegistryClient:
+    client = _shared_clients.get(url)
+    if client is None:
+        address = urlsplit(url)
+        client = RegistryClient(address.hostname or "127.0.0.1", address.port or DEFAULT_PORT)
+        _shared_clients[url] = client
+    return client
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local registry service for the stealth address protocol")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--registry", default="registry.db", help="recipient registry file")
+    parser.add_argument("--ephemeral-registry", default="ephemeral_registry.log", help="ephemeral log file")
+    args = parser.parse_args()
+
+    registry_server = RegistryServer(args.registry, args.ephemeral_registry)
+    print(f"Registry service listening on {SCHEME}://{args.host}:{args.port}")
+    try:
+        asyncio.run(registry_server.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        registry_server.close()
@@ -0,0 +1,74 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, NamedTuple
+from crypto.Random import get_random_bytes
+from kyber_numpy import PreparedPublicKey, encapsulate
+from public_key_cache import prepared_public_key_cache
+from pqsap_implementation import (compute_view_tag, generate_stealth_address,
+                                  register_ephemeral_keys, retrieve_public_keys)
+
+
+class StealthPayment(NamedTuple):
+    recipient_id: Any
+    metadata: Any
+    stealth_address: bytes
+    rk: bytes
+    ciphertext: bytes
+
+
+def send_stealth_payments(payments, registry_file="registry.db",
+                          ephemeral_registry_file="ephemeral_registry.log", workers=1):
+    """
+    Sends a batch of stealth payments.
+
+    Public keys are resolved with one registry query and prepared once per
+    recipient (prepared keys are cached next to the registry entries). All
+    payments to the same recipient are encapsulated in one vectorized call,
+    recipients can be spread over a pool of worker processes, and all
+    announcements are committed to the ephemeral registry in a single group write.
+
+    :param payments: List of (recipient_id, metadata) pairs, metadata can be an amount or any other value
+    :param registry_file: Path of the recipient registry
+    :param ephemeral_registry_file: Path of the ephemeral registry
+    :param workers: Number of worker processes, 1 encapsulates in-process, None uses every CPU
+    :return: List of StealthPayment in the order of the payments
+    """
+    payments = list(payments)
+    if not payments:
+        return []
+
+    public_keys = retrieve_public_keys([recipient_id for recipient_id, _ in payments], registry_file)
+    rows = {}
+    for row, (recipient_id, _) in enumerate(payments):
+        rows.setdefault(recipient_id, []).append(row)
+    prepared = {
+        recipient_id: prepared_public_key_cache.get(
+            registry_file, recipient_id, lambda recipient_id, _: PreparedPublicKey(public_keys[recipient_id]))
+        for recipient_id in rows
+    }
+
+    workers = min(workers or os.cpu_count() or 1, len(rows))
+    arguments = ([prepared[recipient_id] for recipient_id in rows], [len(group) for group in rows.values()])
+    if workers == 1:
+        groups = list(map(encapsulate, *arguments))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            groups = list(executor.map(encapsulate, *arguments))
+
+    encapsulations = [None] * len(payments)
+    for group_rows, group in zip(rows.values(), groups):
+        for row, encapsulation in zip(group_rows, group):
+            encapsulations[row] = encapsulation
+
+    sent = []
+    for (recipient_id, metadata), (ciphertext, shared_key) in zip(payments, encapsulations):
+        rk = get_random_bytes(32)
+        stealth_address = generate_stealth_address(rk, shared_key, public_keys[recipient_id])
+        sent.append(StealthPayment(recipient_id, metadata, stealth_address, rk, ciphertext))
+
+    register_ephemeral_keys(
+        ((payment.ciphertext, compute_view_tag(shared_key), payment.rk)
+         for payment, (_, shared_key) in zip(sent, encapsulations)),
+        ephemeral_registry_file,
+    )
+    return sent
@@ -0,0 +1,200 @@
+import multiprocessing as mp
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from typing import NamedTuple
+from crypto.Hash import SHA3_256
+from ephemeral_log import EphemeralLogReader
+from kyber_numpy import (CIPHERTEXT_BYTES, as_ciphertext_array, decrypt_candidates,
+                         prepare_secret_key, reencryption_matches)
+
+VIEW_TAG_SIZE = 1
+
+# number of announcements decapsulated together by the batch engine
+BLOCK_SIZE = 256
+
+
+class Announcement(NamedTuple):
+    index: int
+    ciphertext: bytes
+    view_tag: bytes
+    # sender randomness of the stealth address, empty when it was not published
+    rk: bytes = b""
+
+
+def compute_view_tag(shared_key):
+    # short tag published next to the ciphertext, it lets the recipient
+    # discard announcements that are not theirs without a full decapsulation
+    return SHA3_256.new(b"view tag" + shared_key).digest()[:VIEW_TAG_SIZE]
+
+
+def _tag_matches(candidate, view_tag):
+    if len(view_tag) != VIEW_TAG_SIZE:
+        # legacy announcement, the view tag is the whole shared key
+        return candidate == view_tag
+    return compute_view_tag(candidate) == view_tag
+
+
+def match_block(ciphertexts, view_tags, private_key):
+    """
+    Matches a block of announcements against one secret key with the batch
+    Kyber512 engine.
+
+    Every ciphertext is decrypted to the key it would decapsulate to, rows whose
+    view tag does not match that key are rejected, and only the remaining rows
+    go through the re-encryption check of the decapsulation.
+
+    :param ciphertexts: List of Kyber512 ciphertexts
+    :param view_tags: List of view tags, or full shared keys for legacy rows
+    :param private_key: Kyber512 secret key of the recipient, or its PreparedSecretKey
+    :return: List with the shared key of every matching row and None elsewhere
+    """
+    results = [None] * len(ciphertexts)
+    # a ciphertext of the wrong size can never decapsulate correctly
+    rows = [row for row, ciphertext in enumerate(ciphertexts) if len(ciphertext) == CIPHERTEXT_BYTES]
+    if not rows:
+        return results
+
+    prepared = prepare_secret_key(private_key)
+    array = as_ciphertext_array(ciphertexts[row] for row in rows)
+    decrypted = decrypt_candidates(prepared, array)
+    survivors = [i for i, row in enumerate(rows) if _tag_matches(decrypted.keys[i], view_tags[row])]
+    if not survivors:
+        return results
+
+    valid = reencryption_matches(prepared, array[survivors], decrypted.messages[survivors],
+                                 [decrypted.coins[i] for i in survivors])
+    for i, ok in zip(survivors, valid):
+        if ok:
+            results[rows[i]] = decrypted.keys[i]
+    return results
+
+
+def match_announcement(ciphertext, view_tag, private_key):
+    """
+    Checks whether an announcement is addressed to the owner of the private key.
+
+    :param ciphertext: Kyber512 ciphertext of the announcement
+    :param view_tag: View tag of the announcement, or the full shared key for legacy rows
+    :param private_key: Kyber512 secret key of the recipient
+    :return: Shared key if the announcement matches, None otherwise
+    """
+    return match_block([ciphertext], [view_tag], private_key)[0]
+
+
+def blocks(iterable, size=BLOCK_SIZE):
+    iterator = iter(iterable)
+    while block := list(islice(iterator, size)):
+        yield block
+
+
+def match_announcements(announcements, private_key, block_size=BLOCK_SIZE):
+    """
+    Matches a stream of announcements against one secret key, block by block.
+
+    :param announcements: Iterable of Announcement
+    :param private_key: Kyber512 secret key of the recipient
+    :param block_size: Number of announcements decapsulated together
+    :return: Generator of (announcement, shared_key) for every match
+    """
+    prepared = prepare_secret_key(private_key)
+    for block in blocks(announcements, block_size):
+        _, ciphertexts, view_tags, _ = zip(*block)
+        for announcement, shared_key in zip(block, match_block(ciphertexts, view_tags, prepared)):
+            if shared_key is not None:
+                yield announcement, shared_key
+
+
+def match_many(announcements, private_keys, block_size=BLOCK_SIZE):
+    """
+    Matches every announcement against a set of secret keys in a single pass.
+
+    :param announcements: Iterable of Announcement
+    :param private_keys: Dictionary mapping a key ID to a Kyber512 secret key
+    :param block_size: Number of announcements decapsulated together
+    :return: Dictionary mapping every key ID to a list of (index, shared_key)
+    """
+    matches = {key_id: [] for key_id in private_keys}
+    # every key is unpacked once for the whole pass
+    prepared_keys = {key_id: prepare_secret_key(private_key) for key_id, private_key in private_keys.items()}
+    for block in blocks(announcements, block_size):
+        for key_id, prepared in prepared_keys.items():
+            if not block:
+                break
+            indices, ciphertexts, view_tags, _ = zip(*block)
+            results = match_block(ciphertexts, view_tags, prepared)
+            matches[key_id].extend((index, key) for index, key in zip(indices, results) if key is not None)
+            # a ciphertext decapsulates correctly under one key only
+            block = [announcement for announcement, key in zip(block, results) if key is None]
+    return matches
+
+
+# index of the earliest chunk known to contain a match, shared by the workers
+_first_match_chunk = None
+
+
+def _init_worker(first_match_chunk):
+    global _first_match_chunk
+    _first_match_chunk = first_match_chunk
+
+
+def _scan_chunk(path, private_key, chunk_number, start_offset, start_index, count, first_only, block_size):
+    matches = []
+    prepared = prepare_secret_key(private_key)
+    with EphemeralLogReader(path) as reader:
+        records = (Announcement(record.index, record.ciphertext, record.view_tag, record.rk)
+                   for record in reader.records(start_offset, start_index, count))
+        for block in blocks(records, block_size):
+            # an earlier chunk already holds the first match, nothing here can be returned
+            if first_only and _first_match_chunk.value < chunk_number:
+                break
+            indices, ciphertexts, view_tags, _ = zip(*block)
+            results = match_block(ciphertexts, view_tags, prepared)
+            matches.extend((index, key) for index, key in zip(indices, results) if key is not None)
+            if first_only and matches:
+                with _first_match_chunk.get_lock():
+                    _first_match_chunk.value = min(_first_match_chunk.value, chunk_number)
+                return matches[:1]
+    return matches
+
+
+def parallel_scan(private_key, ephemeral_registry_file="ephemeral_registry.log",
+                  workers=None, chunk_size=4 * BLOCK_SIZE, first_only=False):
+    """
+    Scans a binary ephemeral log with a pool of worker processes.
+
+    The log is split into chunks of consecutive records, every chunk is scanned
+    in a separate process and the results are merged in registry order. When
+    only the first match is requested, chunks after a matching one are cancelled
+    and the running ones stop early.
+
+    :param private_key: Kyber512 secret key of the recipient
+    :param ephemeral_registry_file: Path of the binary ephemeral log
+    :param workers: Number of worker processes, defaults to the number of CPUs
+    :param chunk_size: Number of announcements per chunk
+    :param first_only: Stop at the first match
+    :return: List of (index, shared_key) for every match, in registry order
+    """
+    with EphemeralLogReader(ephemeral_registry_file) as reader:
+        chunks = reader.chunks(chunk_size)
+    if not chunks:
+        return []
+
+    workers = min(workers or os.cpu_count() or 1, len(chunks))
+    first_match_chunk = mp.Value("q", sys.maxsize)
+    matches = []
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(first_match_chunk,)) as executor:
+        futures = [
+            executor.submit(_scan_chunk, ephemeral_registry_file, private_key, chunk_number,
+                            start_offset, start_index, count, first_only, BLOCK_SIZE)
+            for chunk_number, (start_offset, start_index, count) in enumerate(chunks)
+        ]
+        for future in futures:
+            matches.extend(future.result())
+            if first_only and matches:
+                for pending in futures:
+                    pending.cancel()
+                break
+    return matches
@@ -0,0 +1,212 @@
+import math
+import numpy as np
+from mlwe_implementation import generate_mlwe_batch
+
+# upper bound on the number of histogram bins, larger moduli are binned
+DEFAULT_BINS = 4096
+
+
+class StreamingStatistics:
+    """
+    One-pass statistics of samples in [0, q), computed chunk by chunk in constant memory.
+
+    Mean and variance are accumulated with the pairwise update of Chan et al.,
+    the values are counted in a histogram of at most `bins` equal-width bins,
+    so the chi-square and Kolmogorov-Smirnov tests against the uniform
+    distribution mod q need no samples to be kept. Partial statistics of
+    different workers are combined with `merge`.
+    """
+
+    def __init__(self, q: int, bins: int = DEFAULT_BINS):
+        if q < 2 or bins < 2:
+            raise ValueError("The tests need a modulus and a number of bins of at least 2.")
+        self.q = q
+        # width of a bin, the last bin may be narrower
+        self.width = -(-q // min(bins, q))
+        self.histogram = np.zeros(-(-q // self.width), dtype=np.int64)
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def update(self, samples):
+        """
+        Adds a chunk of samples.
+
+        :param samples: Integer array of any shape with values in [0, q)
+        :return: self
+        """
+        samples = np.asarray(samples).ravel()
+        if samples.size == 0:
+            return self
+        mean = float(samples.mean())
+        m2 = float(((samples - mean) ** 2).sum())
+        self._combine(samples.size, mean, m2)
+        self.histogram += np.bincount(samples // self.width, minlength=len(self.histogram))
+        return self
+
+    def merge(self, other):
+        """
+        Adds the statistics of another set of samples with the same modulus and binning.
+
+        :param other: StreamingStatistics
+        :return: self
+        """
+        if (other.q, other.width) != (self.q, self.width):
+            raise ValueError("Only statistics with the same modulus and bins can be merged.")
+        self._combine(other.count, other.mean, other.m2)
+        self.histogram += other.histogram
+        return self
+
+    def _combine(self, count, mean, m2):
+        if count == 0:
+            return
+        total = self.count + count
+        delta = mean - self.mean
+        self.mean += delta * count / total
+        self.m2 += m2 + delta * delta * self.count * count / total
+        self.count = total
+
+    @property
+    def variance(self) -> float:
+        return self.m2 / self.count if self.count else 0.0
+
+    @property
+    def std(self) -> float:
+        return math.sqrt(self.variance)
+
+    def _expected(self):
+        # probability of every bin under the uniform distribution mod q
+        widths = np.full(len(self.histogram), self.width, dtype=np.float64)
+        widths[-1] = self.q - self.width * (len(self.histogram) - 1)
+        return widths / self.q
+
+    def _require_samples(self):
+        if self.count == 0:
+            raise ValueError("No samples to test.")
+
+    def chi_square(self):
+        """
+        Chi-square goodness of fit test against the uniform distribution mod q.
+
+        :return: (statistic, degrees_of_freedom, p_value), the p-value uses the Wilson-Hilferty approximation
+        """
+        self._require_samples()
+        expected = self._expected() * self.count
+        statistic = float(((self.histogram - expected) ** 2 / expected).sum())
+        dof = len(self.histogram) - 1
+        z = ((statistic / dof) ** (1 / 3) - (1 - 2 / (9 * dof))) / math.sqrt(2 / (9 * dof))
+        return statistic, dof, 0.5 * math.erfc(z / math.sqrt(2))
+
+    def kolmogorov_smirnov(self):
+        """
+        Kolmogorov-Smirnov test against the uniform distribution mod q, evaluated at the bin edges.
+
+        :return: (statistic, p_value), the p-value uses the asymptotic Kolmogorov distribution
+        """
+        self._require_samples()
+        empirical = np.cumsum(self.histogram) / self.count
+        uniform = np.cumsum(self._expected())
+        statistic = float(np.abs(empirical - uniform).max())
+        root = math.sqrt(self.count)
+        x = (root + 0.12 + 0.11 / root) * statistic
+        if x < 0.2:
+            return statistic, 1.0
+        p_value = 2 * sum((-1) ** (j - 1) * math.exp(-2 * j * j * x * x) for j in range(1, 101))
+        return statistic, min(max(p_value, 0.0), 1.0)
+
+    def summary(self) -> dict:
+        chi_square, dof, chi_square_p = self.chi_square()
+        ks, ks_p = self.kolmogorov_smirnov()
+        return {
+            "count": self.count,
+            "mean": self.mean,
+            "std": self.std,
+            "uniform_mean": (self.q - 1) / 2,
+            "uniform_std": math.sqrt((self.q * self.q - 1) / 12),
+            "chi_square": chi_square,
+            "chi_square_dof": dof,
+            "chi_square_p": chi_square_p,
+            "ks": ks,
+            "ks_p": ks_p,
+        }
+
+
+def streaming_statistics(chunks, q, bins=DEFAULT_BINS) -> StreamingStatistics:
+    """
+    :param chunks: Iterable of sample arrays
+    :param q: Modulus
+    :param bins: Maximum number of histogram bins
+    :return: StreamingStatistics of all the chunks
+    """
+    statistics = StreamingStatistics(q, bins)
+    for chunk in chunks:
+        statistics.update(chunk)
+    return statistics
+
+
+def differentiate_from_uniform(statistics, alpha=0.01) -> bool:
+    """
+    Tests if the samples can be differentiated from uniform samples mod q.
+
+    :param statistics: StreamingStatistics of the samples
+    :param alpha: Significance level of each test
+    :return: Boolean indicating if either test rejects uniformity
+    """
+    return statistics.chi_square()[2] < alpha or statistics.kolmogorov_smirnov()[1] < alpha
+
+
+def mlwe_sample_chunks(n, q, m, error_std, chunks, instances_per_chunk=64, seed=None):
+    """
+    Generates the noisy outputs b of MLWE instances chunk by chunk.
+
+    :return: Generator of arrays of shape (instances_per_chunk, m)
+    """
+    seed = np.random.SeedSequence(seed).entropy
+    for chunk in range(chunks):
+        _, b, _ = generate_mlwe_batch(n, q, m, error_std, instances_per_chunk, seed, chunk * instances_per_chunk)
+        yield b
+
+
+def test_streaming_statistics():
+    """
+    Tests the streaming statistics on MLWE, uniform and biased samples.
+    """
+    n, q, m, e_std = 16, 3329, 64, 2
+    statistics = streaming_statistics(mlwe_sample_chunks(n, q, m, e_std, 64, seed=42), q)
+
+    rng = np.random.default_rng(42)
+    parts = [streaming_statistics((rng.integers(0, q, size=4096) for _ in range(16)), q) for _ in range(4)]
+    merged = parts[0]
+    for part in parts[1:]:
+        merged.merge(part)
+    biased = streaming_statistics((np.round(rng.normal(0, 100, size=4096)).astype(np.int64) % q
+                                   for _ in range(16)), q)
+
+    samples = rng.integers(0, q, size=10000)
+    chunked = streaming_statistics(np.array_split(samples, 7), q)
+    exact = abs(chunked.mean - samples.mean()) < 1e-9 and abs(chunked.std - samples.std()) < 1e-6
+    print("Chunked mean and std match numpy:", "PASS" if exact else "FAIL")
+
+    # a worker that received no chunks
+    empty = StreamingStatistics(q).merge(StreamingStatistics(q))
+    merged_empty = streaming_statistics([samples], q).merge(empty)
+    try:
+        empty.summary()
+        rejected = False
+    except ValueError:
+        rejected = True
+    print("Empty statistics merge and are rejected by the tests:",
+          "PASS" if merged_empty.count == samples.size and rejected else "FAIL")
+
+    for name, result, expected in (("MLWE", statistics, False), ("Uniform (merged)", merged, False),
+                                   ("Biased", biased, True)):
+        summary = result.summary()
+        print(f"{name}: {summary['count']} samples, chi-square p={summary['chi_square_p']:.4f}, "
+              f"KS p={summary['ks_p']:.4f}")
+        print("Can differentiate from uniform:", "YES" if differentiate_from_uniform(result) else "NO",
+              "PASS" if differentiate_from_uniform(result) == expected else "FAIL")
+    print("-" * 50)
+
+
+if __name__ == "__main__":
+    test_streaming_statistics()